@@ -408,6 +408,7 @@ class AdminDashboard {
         const recipient = document.getElementById('recipientEmail').value;
         const subject = document.getElementById('emailSubject').value;
         const message = document.getElementById('emailMessage').value;
+        const recipients = recipient.split(/[,;\s]+/).filter(address => address);
         
         // Show loading state
         const submitBtn = document.querySelector('#emailForm button[type="submit"]');
@@ -416,6 +417,11 @@ class AdminDashboard {
         submitBtn.disabled = true;
         
         try {
+            if (recipients.length > 1) {
+                await this.sendBulkEmail(recipients, subject, message);
+                return;
+            }
+            
             const response = await fetch('http://localhost:5000/api/send-email', {
                 method: 'POST',
                 headers: {
@@ -448,6 +454,42 @@ class AdminDashboard {
         }
     }
     
+    async sendBulkEmail(recipients, subject, message) {
+        // One request for every recipient; the server sends them in parallel
+        const response = await fetch('http://localhost:5000/api/send-bulk-email', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                recipients: recipients,
+                subject: subject,
+                message: message
+            })
+        });
+        
+        const result = await response.json();
+        
+        if (!result.results) {
+            this.showNotification('error', `❌ Failed to send emails: ${result.error || 'Unknown error'}`);
+            return;
+        }
+        
+        result.results
+            .filter(entry => entry.status === 'sent')
+            .forEach(entry => this.logEmailActivity(entry.email, subject));
+        
+        if (result.success) {
+            this.showNotification('success', `✅ Email sent to ${result.sent} recipients!`);
+            this.closeEmailPanel();
+        } else {
+            const failed = result.results
+                .filter(entry => entry.status !== 'sent')
+                .map(entry => `${entry.email} (${entry.error})`);
+            this.showNotification('error', `❌ Sent ${result.sent} of ${result.results.length}. Not sent: ${failed.join(', ')}`);
+        }
+    }
+    
     closeEmailPanel() {
         document.getElementById('emailPanel').style.display = 'none';
     }
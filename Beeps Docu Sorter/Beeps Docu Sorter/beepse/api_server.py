@@ -4,13 +4,24 @@ Simple Flask API to connect frontend to document processor
 Run this to enable real document processing from web interface
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import json
 import os
-import tempfile
+import shutil
+import uuid
+from werkzeug.utils import secure_filename
+from bulk_mailer import BulkMailer
+from client_roster import ClientRoster
 from document_processor import DocumentProcessor
 from email_service import EmailService
+from job_queue import JobQueue
+from metrics import METRICS
+from profiler import RunProfiler
+from upload_spool import SpoolingRequest, UploadRejected, UploadSpool, client_key
 
 app = Flask(__name__)
+# Multipart file parts stream straight into the upload spool (see below)
+app.request_class = SpoolingRequest
 
 # Simple CORS headers
 @app.after_request
@@ -20,53 +31,264 @@ def after_request(response):
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
-# Initialize services
-processor = DocumentProcessor()
-email_service = EmailService()
+# Initialize services. Batch worker processes import this module again as
+# __mp_main__ (see document_processor.batch_context); they only run
+# document_processor code and must not start a second job queue or outbox
+if __name__ != '__mp_main__':
+    roster = ClientRoster()
+    if os.getenv('CLIENT_ROSTER'):
+        print(f"👥 Loaded {roster.load_csv(os.getenv('CLIENT_ROSTER'))} clients from {os.getenv('CLIENT_ROSTER')}")
+    # One email service, so the processor and the endpoints share its SMTP pool
+    # and its outbox (notifications are queued and sent in the background)
+    email_service = EmailService()
+    email_service.use_outbox(
+        os.path.join(os.getenv('JOB_STORE', 'job_store'), 'email_outbox.sqlite3')
+    ).start()
+    # PROFILE=1 profiles every document from startup (see /api/profile)
+    processor = DocumentProcessor(roster=roster, email_service=email_service,
+                                  profiler=RunProfiler() if os.getenv('PROFILE') == '1' else None,
+                                  max_pages=int(os.getenv('MAX_PDF_PAGES', '500')),
+                                  max_memory_mb=int(os.getenv('MAX_MEMORY_MB', '0')) or None)
+    bulk_mailer = BulkMailer(email_service, max_recipients=int(os.getenv('MAX_BULK_RECIPIENTS', '500')))
+    job_queue = JobQueue(
+        processor,
+        store_dir=os.getenv('JOB_STORE', 'job_store'),
+        workers=int(os.getenv('JOB_WORKERS', '2'))
+    )
 
-# Debug: Print email credentials being used
-print(f"📧 API Server Email Config:")
-print(f"   Gmail User: {email_service.gmail_user}")
-print(f"   Admin Email: {email_service.admin_email}")
-print(f"   Password Length: {len(email_service.gmail_password)}")
-print()
+    # Upload limits: per request, and per client over a rolling 24 hours
+    upload_spool = UploadSpool(
+        job_queue.store_dir,
+        max_request_bytes=int(os.getenv('MAX_UPLOAD_MB', '50')) * 1024 * 1024,
+        max_client_bytes=int(os.getenv('MAX_CLIENT_UPLOAD_MB', '500')) * 1024 * 1024,
+        max_batch_bytes=int(os.getenv('MAX_BATCH_MB', '500')) * 1024 * 1024,
+        batch_endpoints=['process_batch']
+    )
+    app.config['UPLOAD_SPOOL'] = upload_spool
+
+    # Gauges read when /metrics is scraped
+    METRICS.gauge('beeps_job_queue_depth', 'API jobs waiting for a worker',
+                  callback=lambda: job_queue.counts()['queued'])
+    METRICS.gauge('beeps_jobs', 'API jobs by state', ('state',), callback=job_queue.counts)
+    METRICS.gauge('beeps_outbox_emails', 'Notification emails in the outbox by state', ('state',),
+                  callback=lambda: email_service.outbox.counts())
+
+    # Debug: Print email credentials being used
+    print(f"📧 API Server Email Config:")
+    print(f"   Gmail User: {email_service.gmail_user}")
+    print(f"   Admin Email: {email_service.admin_email}")
+    print(f"   Password Length: {len(email_service.gmail_password)}")
+    print()
+
+# Worker processes per batch request (0 = one per CPU)
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '0'))
+
+@app.errorhandler(UploadRejected)
+def upload_rejected(error):
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'message': 'Upload rejected'
+    }), error.status_code
 
 @app.route('/api/process-document', methods=['POST'])
 def process_document():
-    """Process uploaded document with real email notifications"""
+    """Accept an upload and queue it for processing; returns a job ID at once"""
     
     try:
         # Get file and client info from request
-        file = request.files['document']
+        file = request.files.get('document')
+        if file is None:
+            return jsonify({
+                'success': False,
+                'error': 'No document uploaded'
+            }), 400
         client_email = request.form.get('clientEmail')
         client_name = request.form.get('clientName')
+        client_id, match_confidence = processor.match_client(client_name)
+        
+        # The body has already been streamed to the spool, type-checked and
+        # hashed; move it into the job store named for its real type
+        job_id = job_queue.new_job()
+        filename = secure_filename(file.filename or '') or 'document'
+        upload_path, size, content_hash = upload_spool.store(file.stream, job_queue.job_dir(job_id), filename)
+        job_queue.submit(job_id, upload_path, client_email=client_email, client_name=client_name,
+                         content_hash=content_hash)
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            file.save(temp_file.name)
-            
-            # Process with real email notifications
-            result = processor.process_file(
-                temp_file.name, 
-                client_email=client_email, 
-                client_name=client_name
-            )
-            
-            # Clean up temp file
-            os.unlink(temp_file.name)
-            
+        return jsonify({
+            'success': True,
+            'jobId': job_id,
+            'statusUrl': f'/api/jobs/{job_id}',
+            'size': size,
+            'sha256': content_hash,
+            'clientId': client_id,
+            'matchConfidence': match_confidence,
+            'message': 'Document queued for processing'
+        }), 202
+    
+    except UploadRejected as e:
+        return upload_rejected(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'message': 'Document upload failed'
+        }), 500
+
+@app.route('/api/process-batch', methods=['POST'])
+def process_batch():
+    """Process many uploads at once: any number of "documents" parts, each
+    a document or a ZIP of documents. Files are processed in parallel and
+    the response streams one NDJSON line per document as it finishes."""
+    
+    batch_dir = job_queue.store_dir / "batches" / uuid.uuid4().hex
+    try:
+        uploads = request.files.getlist('documents')
+        client_email = request.form.get('clientEmail')
+        client_name = request.form.get('clientName')
+        if not uploads:
             return jsonify({
-                'success': True,
-                'result': result,
-                'message': 'Document processed successfully'
-            })
-            
+                'success': False,
+                'error': 'No documents uploaded'
+            }), 400
+        
+        # Everything is on disk before the response starts; files refused
+        # along the way are reported in the stream rather than failing the batch
+        batch_dir.mkdir(parents=True)
+        paths, refused = [], []
+        for upload in uploads:
+            filename = secure_filename(upload.filename or '') or 'document'
+            try:
+                path, _, _ = upload_spool.store(upload.stream, batch_dir, filename)
+            except UploadRejected as e:
+                refused.append(batch_line(upload.filename or filename, e))
+                continue
+            if path.suffix != '.zip':
+                paths.append(path)
+                continue
+            for name, member in upload_spool.extract(path, batch_dir, client_key(request)):
+                if isinstance(member, UploadRejected):
+                    refused.append(batch_line(name, member))
+                else:
+                    paths.append(member)
+            path.unlink()
+    except UploadRejected as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        return upload_rejected(e)
     except Exception as e:
+        shutil.rmtree(batch_dir, ignore_errors=True)
         return jsonify({
             'success': False,
             'error': str(e),
-            'message': 'Document processing failed'
+            'message': 'Batch upload failed'
         }), 500
+    
+    def results():
+        try:
+            for line in refused:
+                yield line
+            for record in processor.iter_process(paths, workers=BATCH_WORKERS,
+                                                 client_email=client_email, client_name=client_name):
+                yield json.dumps({
+                    'file': record['file'],
+                    'status': record['status'],
+                    'outputPath': record['output_path'],
+                    'seconds': record['seconds'],
+                    'clientId': record.get('client_id'),
+                    'matchConfidence': record.get('match_confidence'),
+                    **({'error': record['error']} if 'error' in record else {}),
+                    **({'reason': record['reason']} if 'reason' in record else {})
+                }) + "\n"
+        finally:
+            # Runs when the stream ends or the client disconnects
+            shutil.rmtree(batch_dir, ignore_errors=True)
+    
+    return Response(results(), mimetype='application/x-ndjson')
+
+def batch_line(filename, rejection):
+    """NDJSON line for a batch file refused before processing"""
+    status = "UNSUPPORTED_FORMAT" if rejection.status_code == 415 else "ERROR"
+    return json.dumps({
+        'file': filename,
+        'status': status,
+        'outputPath': None,
+        'seconds': None,
+        'error': str(rejection)
+    }) + "\n"
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: stage timings, status counts, queue and in-flight gauges"""
+    
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profile', methods=['GET'])
+def profile_report():
+    """Slowest files, hottest functions and allocation growth since profiling started"""
+    
+    if processor.profiler is None:
+        return jsonify({
+            'success': False,
+            'enabled': False,
+            'error': 'Profiling is off (POST {"enabled": true} to /api/profile)'
+        }), 404
+    
+    top = request.args.get('top', type=int)
+    return jsonify({'success': True, 'enabled': True, **processor.profiler.report(top)})
+
+@app.route('/api/profile', methods=['POST'])
+def update_profile():
+    """Switch profiling on or off: {"enabled": true, "memory": true, "reset": false}"""
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('enabled', True):
+        if processor.profiler is None or data.get('reset'):
+            processor.profiler = RunProfiler(memory=data.get('memory', True))
+    else:
+        processor.profiler = None
+    return jsonify({'success': True, 'enabled': processor.profiler is not None})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the state and result of a processing job"""
+    
+    status = job_queue.status(job_id)
+    if status is None:
+        return jsonify({
+            'success': False,
+            'error': 'Unknown job ID'
+        }), 404
+    
+    return jsonify({'success': True, **status})
+
+@app.route('/api/clients', methods=['POST'])
+def update_clients():
+    """Add or update roster entries: {"clients": [{"client_id": ..., "name": ...}]}"""
+    
+    try:
+        data = request.get_json()
+        count = roster.load((client['client_id'], client['name']) for client in data.get('clients', []))
+        return jsonify({
+            'success': True,
+            'updated': count,
+            'total': len(roster)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/clients/match', methods=['GET'])
+def match_client():
+    """Match a client name to a roster ID"""
+    
+    client_id, confidence = processor.match_client(request.args.get('name', ''))
+    return jsonify({
+        'success': client_id is not None,
+        'clientId': client_id,
+        'confidence': confidence
+    })
 
 @app.route('/api/test-email', methods=['POST'])
 def test_email():
@@ -84,6 +306,12 @@ def test_email():
             'error': str(e)
         }), 500
 
+@app.route('/api/outbox', methods=['GET'])
+def outbox_status():
+    """Number of queued, sent and failed notification emails"""
+    
+    return jsonify({'success': True, **email_service.outbox.counts()})
+
 @app.route('/api/send-email', methods=['POST'])
 def send_email():
     """Send custom email from admin dashboard"""
@@ -100,11 +328,11 @@ def send_email():
                 'error': 'Missing required fields'
             }), 400
         
-        # Create fresh EmailService instance to avoid caching issues
-        fresh_email_service = EmailService()
-        print(f"🔍 Using credentials: {fresh_email_service.gmail_user} / {len(fresh_email_service.gmail_password)} chars")
+        # Shared service: its pool reconnects by itself if the credentials change
+        print(f"🔍 Using credentials: {email_service.gmail_user} / {len(email_service.gmail_password)} chars")
         
-        success = fresh_email_service.send_email(recipient, subject, message)
+        # Sent straight away so the dashboard can report the outcome
+        success = email_service.send_now(recipient, subject, message)
         
         return jsonify({
             'success': success,
@@ -117,6 +345,54 @@ def send_email():
             'error': str(e)
         }), 500
 
+@app.route('/api/send-bulk-email', methods=['POST'])
+def send_bulk_email():
+    """Send one templated email to many recipients from the admin dashboard
+    
+    {"subject": "...", "message": "Dear ${clientName}, ...",
+     "recipients": ["a@example.com", {"email": "b@example.com", "variables": {"clientName": "B"}}],
+     "variables": {...shared by all recipients}}
+    """
+    
+    try:
+        data = request.get_json()
+        subject = data.get('subject')
+        message = data.get('message')
+        recipients = data.get('recipients') or []
+        
+        if not all([recipients, subject, message]):
+            return jsonify({
+                'success': False,
+                'error': 'Missing required fields'
+            }), 400
+        
+        try:
+            results = bulk_mailer.send(subject, message, recipients, data.get('variables'),
+                                       is_html=bool(data.get('isHtml')))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        sent = sum(result['status'] == 'sent' for result in results)
+        deferred = sum(result['status'] == 'deferred' for result in results)
+        return jsonify({
+            'success': sent + deferred == len(results),
+            'sent': sent,
+            'deferred': deferred,
+            'failed': len(results) - sent - deferred,
+            'results': results,
+            'message': f'Sent {sent} of {len(results)} emails' +
+                       (f', {deferred} queued behind the sending limit' if deferred else '')
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 if __name__ == '__main__':
     print("🚀 Starting Document Processing API...")
     print("📧 Make sure Gmail is configured (run setup_gmail.py)")
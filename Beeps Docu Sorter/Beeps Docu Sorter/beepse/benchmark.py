@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the document processing pipeline
+Run: python3 benchmark.py parse [file.pdf ...]
+     python3 benchmark.py ocr [photo.jpg ...]
+     python3 benchmark.py ocr-engine [--images 50] [--workers 4]
+     python3 benchmark.py email [--emails 200] [--fail-rate 0.2] [--delay 0.01]
+     python3 benchmark.py throughput [--sizes 50 200 1000] [--json out.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import PyPDF2
+import pytesseract
+from PIL import Image, ImageDraw, ImageFont
+import corpus
+from document_processor import DocumentProcessor
+from email_service import EmailService
+from image_preprocessor import ImagePreprocessor
+from ocr_engine import PooledOcrEngine, SubprocessOcrEngine
+from smtp_sink import SmtpSink
+
+try:
+    import resource
+except ImportError:  # Windows: no peak-RSS numbers
+    resource = None
+
+SAMPLE_LETTER = """DEPARTMENT OF VETERANS AFFAIRS
+Veterans Benefits Administration
+Regional Office
+ARIANA ATKINS
+VA File Number
+209 684 1394
+Rating Decision
+08/05/2025"""
+
+def make_blank_pdf(path, pages):
+    """Write a PDF with the given number of blank pages"""
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    with open(path, 'wb') as file:
+        writer.write(file)
+    return path
+
+def make_photo(path, size=(6000, 4000)):
+    """Write a phone-camera sized JPEG of a letter"""
+    image = Image.new('RGB', size, (236, 232, 224))
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", size[1] // 40)
+    except OSError:
+        font = ImageFont.load_default()
+    draw.multiline_text((size[0] // 10, size[1] // 12), SAMPLE_LETTER, fill=(20, 20, 20),
+                        font=font, spacing=size[1] // 60)
+    image.save(path, 'JPEG', quality=90, dpi=(300, 300))
+    return path
+
+def have_tesseract():
+    """True if the tesseract binary can be found"""
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def time_call(func, repeat):
+    """Run func repeat times and return the median wall time in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def bench_parse(files, repeat):
+    """Compare the old two-parse PDF path with the shared single-parse path"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        processor = DocumentProcessor(Path(work_dir) / "uploads", Path(work_dir) / "processed")
+
+        def two_parses(path):
+            # What process_file used to do: each stage opens the file itself
+            if not processor.is_password_protected(path):
+                processor.extract_text_from_pdf(path)
+
+        def single_parse(path):
+            with processor.open_document(path) as document:
+                if not processor.is_password_protected(path, document):
+                    processor.extract_text_from_pdf(path, document)
+
+        def parse_only(path):
+            with processor.open_document(path):
+                pass
+
+        print(f"{'file':<40} {'parse':>10} {'2 parses':>10} {'shared':>10} {'saved':>8}")
+        for path in files:
+            parse_time = time_call(lambda: parse_only(path), repeat)
+            old_time = time_call(lambda: two_parses(path), repeat)
+            new_time = time_call(lambda: single_parse(path), repeat)
+            saved = (old_time - new_time) / old_time * 100 if old_time else 0.0
+            print(f"{path.name:<40} {parse_time * 1000:>8.2f}ms {old_time * 1000:>8.2f}ms "
+                  f"{new_time * 1000:>8.2f}ms {saved:>7.1f}%")
+
+def bench_ocr(files, repeat, preprocessor):
+    """Compare raw-image OCR with the preprocessed path, per image"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        raw = DocumentProcessor(Path(work_dir) / "uploads", Path(work_dir) / "processed",
+                                image_preprocessor=ImagePreprocessor.raw(), cache=False)
+        prepared = DocumentProcessor(Path(work_dir) / "uploads", Path(work_dir) / "processed",
+                                     image_preprocessor=preprocessor, cache=False)
+
+        tesseract_found = have_tesseract()
+        if not tesseract_found:
+            print("⚠️ Tesseract not found: timing image decode and preprocessing only")
+
+        def prepare_only(processor, path):
+            return processor.image_preprocessor.prepare(processor.image_preprocessor.open(path))
+
+        print(f"{'file':<32} {'pixels in':>11} {'pixels out':>11} {'raw':>10} {'prepared':>10} {'saved':>10}")
+        for path in files:
+            with Image.open(path) as image:
+                pixels_in = image.width * image.height
+            image_out, _ = prepare_only(prepared, path)
+            pixels_out = image_out.width * image_out.height
+
+            if tesseract_found:
+                old_time = time_call(lambda: raw.extract_text_from_image(path), repeat)
+                new_time = time_call(lambda: prepared.extract_text_from_image(path), repeat)
+            else:
+                old_time = time_call(lambda: prepare_only(raw, path)[0].load(), repeat)
+                new_time = time_call(lambda: prepare_only(prepared, path)[0].load(), repeat)
+            print(f"{path.name:<32} {pixels_in:>11,} {pixels_out:>11,} {old_time * 1000:>8.1f}ms "
+                  f"{new_time * 1000:>8.1f}ms {(old_time - new_time) * 1000:>8.1f}ms")
+
+def bench_ocr_engine(image_count, workers):
+    """Images per second: subprocess per image vs warm pooled OCR workers"""
+    if not have_tesseract():
+        print("❌ Tesseract not found: install it to compare OCR engines")
+        return
+
+    images = []
+    with tempfile.TemporaryDirectory() as image_dir:
+        for index in range(image_count):
+            path = make_photo(Path(image_dir) / f"receipt_{index}.jpg", size=(900, 600))
+            with Image.open(path) as image:
+                images.append(image.convert('L'))
+
+    subprocess_engine = SubprocessOcrEngine()
+    start = time.perf_counter()
+    for image in images:
+        subprocess_engine.image_to_string(image)
+    subprocess_time = time.perf_counter() - start
+
+    pooled_engine = PooledOcrEngine(workers)
+    pooled_engine.image_to_string(images[0])  # start and warm the workers
+    start = time.perf_counter()
+    for future in [pooled_engine.submit(image) for image in images]:
+        future.result()
+    pooled_time = time.perf_counter() - start
+    pooled_engine.close()
+
+    print(f"{'engine':<28} {'seconds':>9} {'images/s':>9}")
+    print(f"{'subprocess per image':<28} {subprocess_time:>9.2f} {image_count / subprocess_time:>9.1f}")
+    print(f"{f'pooled ({workers} workers)':<28} {pooled_time:>9.2f} {image_count / pooled_time:>9.1f}")
+
+def bench_email(email_count, fail_rate, delay):
+    """Outbox against the local SMTP sink: time the processing side spends
+    queueing, and how long delivery (with retries) takes behind it"""
+    sink = SmtpSink(port=0, fail_rate=fail_rate, delay=delay, seed=1).start()
+    service = EmailService()
+    service.smtp_server, service.smtp_port, service.smtp_starttls = "127.0.0.1", sink.port, False
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        outbox = service.use_outbox(Path(work_dir) / "outbox.sqlite3", base_delay=0.05,
+                                    max_delay=1.0, poll_interval=0.05, digest_window=0, rate_per_hour=None)
+        start = time.perf_counter()
+        for index in range(email_count):
+            outbox.enqueue(f"client{index}@example.com", "Document Processing Complete ✅", SAMPLE_LETTER)
+        queue_time = time.perf_counter() - start
+
+        outbox.start()
+        while outbox.counts()['pending'] or outbox.counts()['sending']:
+            time.sleep(0.02)
+        delivery_time = time.perf_counter() - start
+        outbox.stop()
+        counts = outbox.counts()
+    service.close()
+    sink.stop()
+
+    print(f"{'emails queued':<28} {email_count:>9}")
+    print(f"{'queueing per email':<28} {queue_time / email_count * 1000:>7.2f}ms")
+    print(f"{'delivered':<28} {counts['sent']:>9}")
+    print(f"{'given up':<28} {counts['failed']:>9}")
+    print(f"{'simulated failures retried':<28} {sink.stats['failed']:>9}")
+    print(f"{'SMTP connections opened':<28} {sink.stats['connections']:>9}")
+    print(f"{'delivery time':<28} {delivery_time:>8.2f}s")
+    print(f"{'emails/s':<28} {counts['sent'] / delivery_time:>9.1f}")
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def _peak_rss_mb(who):
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+def _run_corpus(corpus_dir, workers):
+    """Process a generated corpus (in a fresh process, so peak RSS is this
+    run's alone) and return the timings"""
+    corpus_dir = Path(corpus_dir)
+    manifest = json.loads((corpus_dir / "manifest.json").read_text())['files']
+    with tempfile.TemporaryDirectory() as output_dir:
+        processor = DocumentProcessor(corpus_dir, output_dir, workers=workers, cache=False, outbox=False)
+        files = [corpus_dir / name for name in sorted(manifest)]
+        start = time.perf_counter()
+        records = list(processor.iter_process(files))
+        seconds = time.perf_counter() - start
+
+    stages = {}
+    for record in records:
+        for name, stage_seconds in (record.get('stages') or {}).items():
+            stages.setdefault(name, []).append(stage_seconds)
+        stages.setdefault('total', []).append(record['seconds'] or 0.0)
+    correct = sum(record['status'] == manifest[record['file']]['expected'] for record in records)
+    return {
+        'documents': len(records),
+        'seconds': round(seconds, 3),
+        'docs_per_second': round(len(records) / seconds, 2),
+        'accuracy': round(correct / len(records), 3),
+        'peak_rss_mb': _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        'peak_worker_rss_mb': _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource and workers > 1 else None,
+        'stages': {
+            name: {'count': len(values),
+                   'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                   'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                   'p99_ms': round(percentile(values, 0.99) * 1000, 2)}
+            for name, values in sorted(stages.items())
+        },
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_throughput(sizes, seed, workers, scans):
+    """Documents/s, stage latency percentiles and peak RSS per corpus size"""
+    report = {
+        'benchmark': 'throughput',
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': multiprocessing.cpu_count(),
+        'seed': seed,
+        'workers': workers,
+        'scans': scans,
+        'tesseract': have_tesseract(),
+        'results': [],
+    }
+    spawn = multiprocessing.get_context('spawn')
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            corpus.generate(corpus_dir, size, seed, scans=scans)
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                result = pool.submit(_run_corpus, corpus_dir, workers).result()
+        result['size'] = size
+        report['results'].append(result)
+
+        total = result['stages']['total']
+        print(f"{size:>6} docs  {result['docs_per_second']:>8.1f} docs/s  "
+              f"p50 {total['p50_ms']:>8.1f}ms  p95 {total['p95_ms']:>8.1f}ms  "
+              f"peak RSS {result['peak_rss_mb']} MB  accuracy {result['accuracy']:.0%}")
+        for name, timing in result['stages'].items():
+            if name != 'total':
+                print(f"{'':>8}{name:<10} p50 {timing['p50_ms']:>8.2f}ms  p95 {timing['p95_ms']:>8.2f}ms  "
+                      f"p99 {timing['p99_ms']:>8.2f}ms")
+    return report
+
+def compare_reports(baseline, report, tolerance):
+    """Print changes against a baseline report; returns the regressions"""
+    regressions = []
+    previous = {result['size']: result for result in baseline['results']}
+    print(f"\n📊 Against {baseline.get('commit') or 'baseline'} (tolerance {tolerance:.0%}):")
+    for result in report['results']:
+        old = previous.get(result['size'])
+        if old is None:
+            continue
+        checks = [('docs/s', old['docs_per_second'], result['docs_per_second'], True),
+                  ('p95 ms', old['stages']['total']['p95_ms'], result['stages']['total']['p95_ms'], False)]
+        if old.get('peak_rss_mb') and result.get('peak_rss_mb'):
+            checks.append(('peak RSS MB', old['peak_rss_mb'], result['peak_rss_mb'], False))
+        for label, before, after, higher_is_better in checks:
+            change = (after - before) / before if before else 0.0
+            worse = -change if higher_is_better else change
+            flag = "❌" if worse > tolerance else "✅"
+            if worse > tolerance:
+                regressions.append(f"{result['size']} docs {label}: {before} -> {after}")
+            print(f"  {flag} {result['size']:>6} docs {label:<12} {before:>10} -> {after:<10} ({change:+.1%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Document pipeline benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parse_parser = subparsers.add_parser("parse", help="PDF parse: two parses vs one shared reader")
+    parse_parser.add_argument("files", nargs="*", type=Path,
+                              help="PDFs to time (default: generated blank PDFs)")
+    parse_parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500],
+                              help="page counts for the generated PDFs")
+    parse_parser.add_argument("--repeat", type=int, default=5)
+
+    ocr_parser = subparsers.add_parser("ocr", help="image OCR: raw image vs preprocessing pipeline")
+    ocr_parser.add_argument("files", nargs="*", type=Path,
+                            help="images to time (default: a generated 24 MP phone photo)")
+    ocr_parser.add_argument("--max-side", type=int, default=3000)
+    ocr_parser.add_argument("--binarize", action="store_true")
+    ocr_parser.add_argument("--psm", type=int, default=None)
+    ocr_parser.add_argument("--header-ocr", type=float, default=None)
+    ocr_parser.add_argument("--repeat", type=int, default=3)
+
+    engine_parser = subparsers.add_parser("ocr-engine", help="OCR throughput: subprocess per image vs worker pool")
+    engine_parser.add_argument("--images", type=int, default=50)
+    engine_parser.add_argument("--workers", type=int, default=4)
+
+    email_parser = subparsers.add_parser("email", help="email outbox throughput and retries (offline)")
+    email_parser.add_argument("--emails", type=int, default=200)
+    email_parser.add_argument("--fail-rate", type=float, default=0.2,
+                              help="share of sends the sink fails temporarily")
+    email_parser.add_argument("--delay", type=float, default=0.01, help="seconds the sink spends per email")
+
+    throughput_parser = subparsers.add_parser("throughput", help="end-to-end docs/s, stage percentiles and peak RSS")
+    throughput_parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000],
+                                   help="corpus sizes to run")
+    throughput_parser.add_argument("--seed", type=int, default=42)
+    throughput_parser.add_argument("--workers", type=int, default=1, help="worker processes (0 = one per CPU)")
+    throughput_parser.add_argument("--no-scans", action="store_true",
+                                   help="text PDFs only (scans are slow to OCR and need Tesseract)")
+    throughput_parser.add_argument("--json", default=None, help="write machine-readable results here")
+    throughput_parser.add_argument("--compare", default=None,
+                                   help="earlier --json output to compare against; exits 1 on a regression")
+    throughput_parser.add_argument("--tolerance", type=float, default=0.15,
+                                   help="relative slowdown allowed before --compare fails")
+
+    args = parser.parse_args()
+
+    if args.benchmark == "parse":
+        print("🚀 PDF parse benchmark")
+        if args.files:
+            bench_parse(args.files, args.repeat)
+        else:
+            with tempfile.TemporaryDirectory() as pdf_dir:
+                files = [make_blank_pdf(Path(pdf_dir) / f"blank_{pages}p.pdf", pages)
+                         for pages in args.pages]
+                bench_parse(files, args.repeat)
+
+    elif args.benchmark == "ocr":
+        print("🚀 Image OCR benchmark")
+        preprocessor = ImagePreprocessor(max_side=args.max_side, binarize=args.binarize,
+                                         psm=args.psm, header_fraction=args.header_ocr)
+        if args.files:
+            bench_ocr(args.files, args.repeat, preprocessor)
+        else:
+            with tempfile.TemporaryDirectory() as image_dir:
+                bench_ocr([make_photo(Path(image_dir) / "phone_photo.jpg")], args.repeat, preprocessor)
+
+    elif args.benchmark == "ocr-engine":
+        print("🚀 OCR engine throughput benchmark")
+        bench_ocr_engine(args.images, args.workers)
+
+    elif args.benchmark == "email":
+        print("🚀 Email outbox benchmark (local SMTP sink)")
+        bench_email(args.emails, args.fail_rate, args.delay)
+
+    elif args.benchmark == "throughput":
+        print("🚀 Pipeline throughput benchmark (synthetic corpus)")
+        report = bench_throughput(args.sizes, args.seed, args.workers, not args.no_scans)
+        if args.json:
+            Path(args.json).write_text(json.dumps(report, indent=1))
+            print(f"💾 Results written to {args.json}")
+        if args.compare:
+            regressions = compare_reports(json.loads(Path(args.compare).read_text()), report, args.tolerance)
+            if regressions:
+                print(f"❌ {len(regressions)} regressions")
+                raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
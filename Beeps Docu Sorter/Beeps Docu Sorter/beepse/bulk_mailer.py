@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Bulk Mailer - sends one templated message to many recipients
+Templates are parsed once per request and filled in per recipient; the
+emails go out concurrently over the email service's bounded SMTP pool
+and every recipient gets its own delivery status. Sends count against the
+outbox's rate limit; recipients over it are queued in the outbox instead
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# ${name} placeholders, as in the dashboard's JavaScript templates
+PLACEHOLDER = re.compile(r'\$\{(\w+)\}')
+EMAIL_ADDRESS = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+class MessageTemplate:
+    """A subject or body with ${name} placeholders, split up front so
+    filling it in is a join rather than a search"""
+
+    def __init__(self, text):
+        self.parts = PLACEHOLDER.split(text)
+        # Odd positions hold placeholder names
+        self.names = set(self.parts[1::2])
+
+    def render(self, variables):
+        missing = self.names - variables.keys()
+        if missing:
+            raise ValueError(f"Missing template variables: {', '.join(sorted(missing))}")
+        return "".join(part if index % 2 == 0 else str(variables[part])
+                       for index, part in enumerate(self.parts))
+
+class BulkMailer:
+    def __init__(self, email_service, max_recipients=500):
+        self.email_service = email_service
+        self.max_recipients = max_recipients
+
+    def send(self, subject, message, recipients, variables=None, is_html=False):
+        """Send to every recipient: each an address or {"email", "variables"}.
+        Shared variables apply to all; per-recipient ones override them.
+        Returns a status record per recipient, in request order: sent,
+        deferred (queued in the outbox, over the rate limit), skipped,
+        invalid or failed."""
+        if len(recipients) > self.max_recipients:
+            raise ValueError(f"At most {self.max_recipients} recipients per request")
+        subject_template = MessageTemplate(subject)
+        message_template = MessageTemplate(message)
+        shared = dict(variables or {})
+
+        jobs, seen = [], set()
+        for recipient in recipients:
+            if isinstance(recipient, str):
+                recipient = {'email': recipient}
+            email = (recipient.get('email') or '').strip()
+            jobs.append((email, {**shared, 'email': email, **(recipient.get('variables') or {})},
+                         email.lower() in seen))
+            seen.add(email.lower())
+
+        # Recipients with the same variables share one rendering
+        rendered = {}
+        outbox = self.email_service.outbox
+
+        def deliver(job):
+            email, values, duplicate = job
+            if duplicate:
+                return {'email': email, 'status': 'skipped', 'error': 'Duplicate recipient'}
+            if not EMAIL_ADDRESS.match(email):
+                return {'email': email, 'status': 'invalid', 'error': 'Invalid email address'}
+            key = tuple(sorted((name, str(value)) for name, value in values.items()
+                               if name in subject_template.names | message_template.names))
+            try:
+                if key not in rendered:
+                    rendered[key] = (subject_template.render(values), message_template.render(values))
+                if outbox is not None and not outbox.take_token():
+                    # Over the mail quota: the outbox sends it when the limit allows
+                    email_id = outbox.enqueue(email, *rendered[key], is_html)
+                    return {'email': email, 'status': 'deferred', 'outboxId': email_id}
+                self.email_service.deliver(email, *rendered[key], is_html)
+            except Exception as e:
+                return {'email': email, 'status': 'failed', 'error': str(e)}
+            return {'email': email, 'status': 'sent'}
+
+        # One thread per pooled connection: more would just wait for one
+        with ThreadPoolExecutor(max_workers=self.email_service.pool_size,
+                                thread_name_prefix="bulk-mail") as pool:
+            results = list(pool.map(deliver, jobs))
+
+        sent = sum(result['status'] == 'sent' for result in results)
+        deferred = sum(result['status'] == 'deferred' for result in results)
+        print(f"📨 Bulk email: {sent} of {len(results)} sent, {deferred} queued behind the rate limit")
+        return results
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Client Roster - matches extracted client names to known client IDs
+Trigram index with prefix filtering, so lookups stay sub-millisecond
+with tens of thousands of clients
+"""
+
+import csv
+import math
+import re
+import threading
+from collections import defaultdict
+
+def normalize_name(name):
+    """Upper-case name tokens in sorted order, without punctuation or initials
+
+    "John A. Smith" and "SMITH, JOHN" both become "JOHN SMITH".
+    """
+    tokens = re.sub(r'[^A-Z0-9]+', ' ', name.upper()).split()
+    words = [token for token in tokens if len(token) > 1]
+    return " ".join(sorted(words or tokens))
+
+def trigrams(key):
+    """Character trigrams of a normalized name, padded at the word edges"""
+    padded = f"  {key} "
+    return frozenset(padded[index:index + 3] for index in range(len(padded) - 2))
+
+class ClientRoster:
+    """In-memory index of client names for fuzzy matching
+
+    Scores are the Dice coefficient of the two names' trigram sets
+    (1.0 = same normalized name).
+    """
+
+    def __init__(self, min_score=0.6, margin=0.05):
+        self.min_score = min_score
+        # A runner-up within this of the best score makes the match ambiguous
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._names = {}
+        self._grams = {}
+        self._exact = defaultdict(set)
+        self._postings = defaultdict(set)
+
+    def __getstate__(self):
+        # Batch workers get a copy of the index; the lock is per process
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, client_id, name):
+        """Add a client, or update the name of an existing one"""
+        with self._lock:
+            self._remove(client_id)
+            key = normalize_name(name)
+            grams = trigrams(key)
+            self._names[client_id] = name
+            self._grams[client_id] = grams
+            self._exact[key].add(client_id)
+            for gram in grams:
+                self._postings[gram].add(client_id)
+
+    def remove(self, client_id):
+        """Drop a client from the index"""
+        with self._lock:
+            self._remove(client_id)
+
+    def _remove(self, client_id):
+        if client_id not in self._names:
+            return
+        key = normalize_name(self._names.pop(client_id))
+        self._exact[key].discard(client_id)
+        if not self._exact[key]:
+            del self._exact[key]
+        for gram in self._grams.pop(client_id):
+            self._postings[gram].discard(client_id)
+            if not self._postings[gram]:
+                del self._postings[gram]
+
+    def load(self, records):
+        """Bulk-load (client_id, name) pairs"""
+        count = 0
+        for client_id, name in records:
+            self.add(client_id, name)
+            count += 1
+        return count
+
+    def load_csv(self, path):
+        """Bulk-load a CSV file with client_id and name columns"""
+        with open(path, newline='', encoding='utf-8') as file:
+            return self.load((row['client_id'], row['name']) for row in csv.DictReader(file))
+
+    def name_for(self, client_id):
+        return self._names.get(client_id)
+
+    def match(self, name, min_score=None):
+        """Return (client_id, score) for the best match, or (None, score) if
+        nothing reaches min_score or the match is ambiguous
+
+        Ambiguous means two clients share the normalized name, another
+        client scores within `margin` of the best one, or the name comes
+        down to a single word ("J SMITH" is just "SMITH") and only an exact
+        match will do.
+        """
+        min_score = self.min_score if min_score is None else min_score
+        key = normalize_name(name or "")
+        if not key:
+            return None, 0.0
+
+        with self._lock:
+            exact = self._exact.get(key)
+            if exact:
+                return (min(exact), 1.0) if len(exact) == 1 else (None, 1.0)
+
+            query = trigrams(key)
+            rarest = sorted(query, key=lambda gram: len(self._postings.get(gram, ())))
+            best_id, best_score, runner_up = None, 0.0, 0.0
+            seen = set()
+            # Prefix filtering: a name scoring >= threshold shares at least
+            # `needed` trigrams with the query, so it must appear in one of
+            # the (len(query) - needed + 1) rarest query trigrams' postings.
+            # The threshold rises to just under the best score found so far
+            # (near ties still count), so a strong match on a rare trigram
+            # cuts the scan short.
+            for position, gram in enumerate(rarest):
+                threshold = max(min_score, best_score - self.margin)
+                needed = max(1, math.ceil(threshold * len(query) / (2 - threshold) - 1e-9))
+                if position > len(query) - needed:
+                    break
+                for client_id in self._postings.get(gram, ()):
+                    if client_id in seen:
+                        continue
+                    seen.add(client_id)
+                    grams = self._grams[client_id]
+                    score = 2 * len(query & grams) / (len(query) + len(grams))
+                    if score > best_score:
+                        best_id, best_score, runner_up = client_id, score, best_score
+                    elif score > runner_up:
+                        runner_up = score
+
+        if best_score < min_score or best_score - runner_up < self.margin or len(key.split()) < 2:
+            return None, round(best_score, 3)
+        return best_id, round(best_score, 3)
@@ -0,0 +1,22 @@
+import pytest
+from email_service import EmailService
+from smtp_sink import SmtpSink
+
+# test_email.py and test_processor.py are manual scripts (they send real
+# email and write to uploads/), not part of the automated suite
+collect_ignore = ["test_email.py", "test_processor.py"]
+
+@pytest.fixture
+def sink():
+    """Local SMTP server on a free port"""
+    server = SmtpSink(port=0).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def email_service(sink):
+    """EmailService sending to the sink"""
+    service = EmailService(pool_size=2)
+    service.smtp_server, service.smtp_port, service.smtp_starttls = "127.0.0.1", sink.port, False
+    yield service
+    service.close()
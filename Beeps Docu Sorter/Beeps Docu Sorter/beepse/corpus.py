@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Synthetic Corpus - seeded generator of realistic test documents
+Builds RDL and RCS letters, unwanted ID documents, unclassifiable letters,
+password-protected PDFs, scanned (image-only) pages and multi-page fax
+TIFFs, modelled on the samples in test_processor.py. The same seed always
+gives the same corpus, and manifest.json records the status each file
+should get
+
+Run: python3 corpus.py corpus_dir [--size 200] [--seed 42] [--no-scans]
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+import PyPDF2
+from PyPDF2.generic import DecodedStreamObject, DictionaryObject, NameObject
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+FIRST_NAMES = ["ARIANA", "JOHN", "MARIA", "DAVID", "KEISHA", "ROBERT", "LINDA", "CARLOS",
+               "PATRICIA", "JAMES", "NGUYEN", "SARAH", "MICHAEL", "FATIMA", "WILLIAM", "GRACE"]
+LAST_NAMES = ["ATKINS", "SMITH", "GARCIA", "JOHNSON", "WASHINGTON", "BROWN", "MARTINEZ",
+              "TAYLOR", "ANDERSON", "THOMAS", "MOORE", "JACKSON", "WHITE", "HARRIS", "CLARK"]
+
+# Body text for the pages after the first. Kept clear of every rule
+# pattern so it never changes how a document is classified
+FILLER = [
+    "The evidence of record was reviewed in full before this decision was made.",
+    "Service treatment records and post-service medical records were considered.",
+    "The examiner provided a medical opinion regarding the claimed condition.",
+    "Entitlement is established from the date the claim was received.",
+    "You have one year from the date of this letter to request a review.",
+    "Additional evidence may be submitted at any time before a final decision.",
+    "The evaluation is based on the criteria in the schedule for rating disabilities.",
+    "Please keep this letter with your records for future reference.",
+]
+
+# Share of each kind in a corpus (scans are dropped with --no-scans)
+DEFAULT_MIX = {
+    'rdl': 0.30, 'rcs': 0.20, 'unwanted': 0.10, 'unknown': 0.08,
+    'protected': 0.07, 'scan_rdl': 0.10, 'scan_pdf': 0.05, 'scan_rcs': 0.10, 'scan_fax': 0.05,
+}
+
+# Status each kind should end with (scans need Tesseract to get there)
+EXPECTED_STATUS = {
+    'rdl': "PROCESSED_RDL", 'rcs': "PROCESSED_RCS", 'unwanted': "UNWANTED",
+    'unknown': "NEEDS_REVIEW", 'protected': "PASSWORD_PROTECTED",
+    'scan_rdl': "PROCESSED_RDL", 'scan_pdf': "PROCESSED_RDL", 'scan_rcs': "PROCESSED_RCS",
+    'scan_fax': "PROCESSED_RDL",
+}
+
+def random_name(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def rdl_text(rng, name):
+    file_number = f"{rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(1000, 9999)}"
+    return f"""DEPARTMENT OF VETERANS AFFAIRS
+Veterans Benefits Administration
+Regional Office
+{name}
+VA File Number
+{file_number}
+Rating Decision
+{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/{rng.randint(2019, 2025)}
+INTRODUCTION
+The records reflect that you are a Veteran of the Peacetime."""
+
+def rcs_text(rng, name):
+    client_name = name.title()
+    client_id = f"TM-{rng.randint(1000, 9999)}-{rng.randint(2019, 2025)}"
+    return f"""TM CLIENT AUTHORIZATION FORM
+Document ID: TM-RCS-{rng.randint(2019, 2025)}-{rng.randint(1000, 9999)}
+Client: {client_name} (ID: {client_id})
+Date Issued: {rng.randint(1, 28):02d}-Aug-{rng.randint(2019, 2025)}
+
+Authorization Request
+I, {client_name} (TM Client ID: {client_id}), hereby authorize:"""
+
+def unwanted_text(rng, name):
+    document = rng.choice(["DRIVER'S LICENSE", "PASSPORT", "BIRTH CERTIFICATE"])
+    return f"""STATE OF CALIFORNIA
+{document}
+Name: {name.title()}
+Number: D{rng.randint(1000000, 9999999)}"""
+
+def unknown_text(rng, name):
+    return f"""Dear {name.title()},
+
+Thank you for your recent correspondence regarding your account.
+We will respond within {rng.randint(5, 30)} business days."""
+
+def filler_page(rng):
+    return "\n".join(rng.choice(FILLER) for _ in range(rng.randint(20, 40)))
+
+def _escape_pdf_text(line):
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def write_text_pdf(path, pages, password=None):
+    """PDF with a real text layer: one page per string, in Helvetica"""
+    writer = PyPDF2.PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    }))
+    for text in pages:
+        page = PyPDF2.PageObject.create_blank_page(width=612, height=792)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font})
+        })
+        lines = ["BT /F1 11 Tf 14 TL 50 750 Td"]
+        lines += [f"({_escape_pdf_text(line)}) Tj T*" for line in text.split("\n")]
+        lines.append("ET")
+        content = DecodedStreamObject()
+        content.set_data("\n".join(lines).encode('latin-1', 'replace'))
+        page[NameObject("/Contents")] = writer._add_object(content)
+        writer.add_page(page)
+    if password:
+        writer.encrypt(password)
+    with open(path, 'wb') as file:
+        writer.write(file)
+    return path
+
+def render_scan(rng, text, width=1275, height=1650):
+    """A page of text as a slightly skewed, noisy 150 dpi greyscale scan"""
+    image = Image.new('L', (width, height), 245)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 22)
+    except OSError:
+        font = ImageFont.load_default()
+    draw.multiline_text((110, 120), text, fill=25, font=font, spacing=10)
+    image = image.rotate(rng.uniform(-1.5, 1.5), fillcolor=245, resample=Image.BICUBIC)
+    return image.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 0.8)))
+
+def generate(output_dir, size=200, seed=42, mix=None, scans=True, max_pages=12):
+    """Write `size` documents into output_dir; returns the manifest
+    {filename: {'kind', 'expected', 'pages'}}"""
+    rng = random.Random(seed)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    mix = dict(mix or DEFAULT_MIX)
+    if not scans:
+        mix = {kind: share for kind, share in mix.items() if not kind.startswith('scan')}
+    kinds, weights = zip(*mix.items())
+
+    manifest = {}
+    for index in range(size):
+        kind = rng.choices(kinds, weights)[0]
+        name = random_name(rng)
+        pages = 1 + rng.randrange(max_pages) if kind in ('rdl', 'protected', 'scan_pdf', 'scan_fax') else 1
+        first_page = rcs_text(rng, name) if kind in ('rcs', 'scan_rcs') else {
+            'unwanted': unwanted_text, 'unknown': unknown_text,
+        }.get(kind, rdl_text)(rng, name)
+        texts = [first_page] + [filler_page(rng) for _ in range(pages - 1)]
+        stem = f"{index:05d}_{kind}"
+
+        if kind == 'scan_rdl':
+            filename = f"{stem}.{rng.choice(['jpg', 'png', 'tiff'])}"
+            image = render_scan(rng, first_page)
+            image.save(output_dir / filename, dpi=(150, 150))
+        elif kind == 'scan_rcs':
+            filename = f"{stem}.jpg"
+            render_scan(rng, first_page).save(output_dir / filename, quality=85, dpi=(150, 150))
+        elif kind == 'scan_pdf':
+            # Image-only PDF: no text layer at all
+            filename = f"{stem}.pdf"
+            images = [render_scan(rng, text) for text in texts]
+            images[0].save(output_dir / filename, save_all=True, append_images=images[1:], resolution=150)
+        elif kind == 'scan_fax':
+            # Multi-page black and white TIFF, as a fax server writes them
+            filename = f"{stem}.tif"
+            images = [render_scan(rng, text).point(lambda value: 255 if value > 128 else 0).convert('1')
+                      for text in texts]
+            images[0].save(output_dir / filename, save_all=True, append_images=images[1:],
+                           compression='group4', dpi=(150, 150))
+        else:
+            filename = f"{stem}.pdf"
+            password = f"pw{rng.randint(1000, 9999)}" if kind == 'protected' else None
+            write_text_pdf(output_dir / filename, texts, password)
+
+        manifest[filename] = {'kind': kind, 'expected': EXPECTED_STATUS[kind], 'pages': pages}
+
+    with open(output_dir / "manifest.json", 'w') as file:
+        json.dump({'seed': seed, 'size': size, 'files': manifest}, file, indent=1)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a seeded synthetic document corpus")
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--size", type=int, default=200, help="number of documents")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-scans", action="store_true", help="skip image and image-only PDF documents")
+    parser.add_argument("--max-pages", type=int, default=12, help="most pages in a multi-page letter")
+    args = parser.parse_args()
+
+    manifest = generate(args.output_dir, args.size, args.seed, scans=not args.no_scans,
+                        max_pages=args.max_pages)
+    kinds = {}
+    for entry in manifest.values():
+        kinds[entry['kind']] = kinds.get(entry['kind'], 0) + 1
+    print(f"✅ Wrote {len(manifest)} documents to {args.output_dir}: {kinds}")
+
+if __name__ == "__main__":
+    main()
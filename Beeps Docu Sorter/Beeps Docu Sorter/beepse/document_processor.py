@@ -4,70 +4,469 @@ Document Quality Team - AI Document Processor
 Identifies document types (RDL, RCS) and organizes them automatically
 """
 
+import argparse
+import multiprocessing
 import os
 import re
-import shutil
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import nullcontext
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 import PyPDF2
 from PIL import Image
-import pytesseract
+from client_roster import ClientRoster
 from email_service import EmailService
+from image_preprocessor import ImagePreprocessor
+from journal import ProcessingJournal
+from library import LAYOUTS, Library
+from metrics import IN_FLIGHT, collect_stages, record_document, stage
+from ocr_engine import PooledOcrEngine, SubprocessOcrEngine
+from placement import PLACEMENT_MODES, place_file
+from profiler import RunProfiler
+from result_cache import ResultCache, hash_file
+from rules import RuleEngine
+from watcher import FolderWatcher
+
+# Bump whenever client extraction changes, so cached results produced by the
+# old code are no longer used (edits to rules.py are picked up automatically)
+RULESET_VERSION = "2"
+
+IMAGE_SUFFIXES = ['.jpg', '.jpeg', '.png', '.tiff', '.tif']
+
+class DocumentTooLarge(Exception):
+    """A document went over the page, text or memory limits before it
+    could be classified; the message says which"""
+
+def current_rss_mb():
+    """Resident memory of this process in MB (None without /proc)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def xobject_to_image(xobject):
+    """PIL image of a PDF image XObject (None if it can't be read)
+    
+    JPEG, JPEG 2000 and CCITT fax data open as image files and JPEGs stay
+    undecoded until used; other encodings are raw pixels whose layout
+    follows from their size.
+    """
+    filters = xobject.get('/Filter') or []
+    if not isinstance(filters, list):
+        filters = [filters]
+    data = xobject.get_data()
+    if filters and filters[-1] in ('/DCTDecode', '/JPXDecode', '/CCITTFaxDecode'):
+        return Image.open(BytesIO(data))
+    
+    size = (int(xobject['/Width']), int(xobject['/Height']))
+    modes = {size[0] * size[1]: 'L', 3 * size[0] * size[1]: 'RGB', 4 * size[0] * size[1]: 'CMYK',
+             (size[0] + 7) // 8 * size[1]: '1'}
+    mode = modes.get(len(data))
+    if mode is None or xobject.get('/BitsPerComponent', 8) not in (1, 8):
+        return None
+    return Image.frombytes(mode, size, data)
+
+def iter_frames(image, limit=None):
+    """Yield the frames of a multi-page image (a fax TIFF) one at a time,
+    each decoded only when it's asked for"""
+    for index in range(min(image.n_frames, limit or image.n_frames)):
+        image.seek(index)
+        yield image.copy()
+
+def batch_context():
+    """multiprocessing context for batch worker pools
+    
+    Forking a threaded process (the API, --watch) copies every lock another
+    thread holds at that moment into the child, held for good. The fork
+    server forks workers from a clean single-threaded process instead.
+    Like spawn, it imports the caller's __main__ as __mp_main__, so a main
+    module must not start services when imported that way (see api_server).
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+# Processor used by each batch worker process (set by _init_worker)
+_worker_processor = None
+
+def _init_worker(processor, batch_workers=1):
+    """Install the processor a batch worker process will use
+    
+    The batch workers share the machine, so each gets its share of the OCR
+    concurrency rather than a pool sized for every core. The profiler starts
+    empty whatever the start method: the parent already holds the files it
+    profiled, and a worker sends back only its own.
+    """
+    global _worker_processor
+    _worker_processor = processor
+    if processor.profiler is not None:
+        processor.profiler.reset()
+    engine = processor.ocr_engine
+    if hasattr(engine, 'workers'):
+        engine.workers = max(1, engine.workers // batch_workers)
+
+def _analyse_in_worker(file_path):
+    """Read and classify one file inside a batch worker process (the
+    parent files it, see DocumentProcessor.analyse_file)"""
+    with _worker_processor._profiling(file_path):
+        analysis = _worker_processor.analyse_file(file_path)
+    if _worker_processor.profiler is not None:
+        # The parent adds these to its run profile
+        analysis['profiles'] = _worker_processor.profiler.drain()
+    return analysis
+
+class PdfDocument:
+    """A PDF parsed once and shared by encryption detection, page-text
+    extraction and classification. Use as a context manager."""
+    
+    def __init__(self, file_path):
+        self.path = Path(file_path)
+        self.file = open(self.path, 'rb')
+        try:
+            self.reader = PyPDF2.PdfReader(self.file)
+        except Exception as e:
+            print(f"PDF parse failed: {e}")
+            self.reader = None
+    
+    @property
+    def is_encrypted(self):
+        return bool(self.reader is not None and self.reader.is_encrypted)
+    
+    def page_image(self, index):
+        """The largest image on a page (a scanned page is one big image),
+        with its DPI worked out from the page size, or None"""
+        resolved = self.reader.resolved_objects
+        kept = len(resolved)
+        try:
+            page = self.reader.pages[index]
+            resources = page['/Resources'] if '/Resources' in page else {}
+            xobjects = resources['/XObject'] if '/XObject' in resources else {}
+            images = [xobject.get_object() for xobject in xobjects.values()]
+            images = [xobject for xobject in images if xobject.get('/Subtype') == '/Image']
+            if not images:
+                return None
+            image = xobject_to_image(max(images, key=lambda xobject: xobject['/Width'] * xobject['/Height']))
+            width = float(page.mediabox.width)
+            if image is not None and width:
+                dpi = round(image.width * 72 / width)
+                image.info['dpi'] = (dpi, dpi)
+            return image
+        except Exception as e:
+            print(f"Page image extraction failed: {e}")
+            return None
+        finally:
+            # Scans are big: don't keep the parsed image data in PyPDF2's cache
+            while len(resolved) > kept:
+                resolved.popitem()
+    
+    def close(self):
+        self.file.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
 
 class DocumentProcessor:
-    def __init__(self, input_dir="uploads", output_dir="processed"):
+    def __init__(self, input_dir="uploads", output_dir="processed", workers=1, max_in_flight=None,
+                 stream_pages=False, stream_probe_pages=3, cache=True, cache_max_bytes=256 * 1024 * 1024,
+                 image_preprocessor=None, ocr_engine=None, rules=None, roster=None, placement="copy",
+                 layout="flat", email_service=None, outbox=True, profiler=None, large_document_pages=100,
+                 max_pages=500, max_text_chars=5_000_000, max_memory_mb=None, pdf_ocr=True, min_page_chars=20):
         self.input_dir = Path(input_dir)
         self.output_dir = Path(output_dir)
-        self.email_service = EmailService()
+        # Batch mode: number of worker processes (0 = one per CPU core) and
+        # how many files may be queued to the pool at once
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        # Early exit (opt-in): stop reading PDF pages, OCR fallback pages and
+        # TIFF frames once type and client are known, falling back to a full
+        # read after stream_probe_pages pages. Faster, but unwanted-document
+        # patterns on the unread pages are never checked, so an ID card at
+        # the back of a packet is filed with the letter in front of it
+        self.stream_pages = stream_pages
+        self.stream_probe_pages = stream_probe_pages
+        # Large PDFs: above large_document_pages, objects parsed for a page
+        # are released once its text is out. Reading stops at max_pages
+        # pages, max_text_chars characters or max_memory_mb of resident
+        # memory; a document not classified by then goes to review
+        self.large_document_pages = large_document_pages
+        self.max_pages = max_pages
+        self.max_text_chars = max_text_chars
+        self.max_memory_mb = max_memory_mb
+        # Scanned PDFs: when the text layer doesn't resolve a document,
+        # pages with fewer than min_page_chars characters are OCRed
+        self.pdf_ocr = pdf_ocr
+        self.min_page_chars = min_page_chars
+        # Image cleanup before OCR (ImagePreprocessor.raw() to OCR as-is)
+        self.image_preprocessor = image_preprocessor or ImagePreprocessor()
+        # Tesseract backend (PooledOcrEngine keeps warm OCR workers running)
+        self.ocr_engine = ocr_engine or SubprocessOcrEngine()
+        # Document types, unwanted patterns and their folders
+        self.rules = rules or RuleEngine()
+        # Known clients, for turning extracted names into client IDs
+        self.roster = roster
+        # How outputs reach the library: copy, move, hardlink or reflink
+        if placement not in PLACEMENT_MODES:
+            raise ValueError(f"Unknown placement mode: {placement}")
+        self.placement = placement
+        # Processed library: shard layout, collision suffixes and name index
+        self.library = Library(self.output_dir, layout)
+        # Notifications (pass the API's service to share its SMTP connections)
+        self.email_service = email_service or EmailService()
+        if outbox and self.email_service.outbox is None:
+            # Queue notifications durably and send them on a background
+            # thread, so a slow SMTP server doesn't hold up processing
+            self.email_service.use_outbox(self.output_dir / "email_outbox.sqlite3").start()
+        # Optional RunProfiler: CPU and allocation profile of every file
+        self.profiler = profiler
         self.setup_directories()
+        # Content-hash cache of extraction results; the key includes the
+        # page-reading mode and image settings since both change the text
+        self.cache = None
+        if cache:
+            read_mode = f"stream{stream_probe_pages}" if stream_pages else "full"
+            if pdf_ocr:
+                read_mode += f"+ocr{min_page_chars}"
+            self.cache = ResultCache(
+                self.output_dir / ".result_cache.sqlite3",
+                ruleset_version=f"{RULESET_VERSION}.{self.rules.version}:{read_mode}:{self.image_preprocessor.signature()}",
+                max_bytes=cache_max_bytes
+            )
     
     def setup_directories(self):
         """Create necessary directories"""
         self.input_dir.mkdir(exist_ok=True)
         self.output_dir.mkdir(exist_ok=True)
-        (self.output_dir / "RDL").mkdir(exist_ok=True)
-        (self.output_dir / "RCS").mkdir(exist_ok=True)
-        (self.output_dir / "UNKNOWN").mkdir(exist_ok=True)
-        (self.output_dir / "REVIEW_NEEDED").mkdir(exist_ok=True)
+        for folder in self.rules.output_folders():
+            (self.output_dir / folder).mkdir(exist_ok=True)
+    
+    def open_document(self, file_path):
+        """Parse a PDF once so every stage can share the same reader"""
+        return PdfDocument(file_path)
+    
+    def iter_pdf_pages(self, document, release=False):
+        """Yield the text of each PDF page, one page at a time
+        
+        With release, the objects PyPDF2 parsed for a page (content streams,
+        fonts, images) are dropped from its cache once the text is out, so
+        memory stays flat however many pages the document has.
+        """
+        reader = document.reader
+        resolved = reader.resolved_objects
+        # The page tree is parsed by now; everything cached later is per page
+        kept = len(resolved) if release else None
+        for page in reader.pages:
+            text = page.extract_text()
+            if release:
+                # The cache is a dict, so the newest entries pop off first
+                while len(resolved) > kept:
+                    resolved.popitem()
+            yield text
+    
+    def is_resolved(self, text):
+        """True once the text settles both the document type and client name"""
+        doc_type = self.classify_document(text)
+        if doc_type == "UNKNOWN":
+            return False
+        client_name, _ = self.extract_client_info(text, doc_type)
+        return client_name is not None
     
-    def extract_text_from_pdf(self, file_path):
-        """Extract text from PDF using PyPDF2"""
+    def extract_text_from_pdf(self, file_path, document=None, stream=None):
+        """Extract text from PDF using PyPDF2
+        
+        By default every page is read. In streaming mode (early exit, see
+        __init__) reading stops as soon as the type and client name are
+        resolved; if that hasn't happened within stream_probe_pages pages,
+        the rest of the document is read in full.
+        
+        Reading also stops at the page, text and memory limits. If the text
+        read up to then doesn't resolve the document, DocumentTooLarge is
+        raised.
+        
+        Text-layer PDFs never touch OCR. Only when the text doesn't resolve
+        the document are the pages without usable text OCRed (see
+        ocr_pdf_pages).
+        """
+        if document is None:
+            with self.open_document(file_path) as document:
+                return self.extract_text_from_pdf(file_path, document, stream)
+        
+        if document.reader is None:
+            return ""
+        stream = self.stream_pages if stream is None else stream
         try:
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text()
-                return text
+            page_count = len(document.reader.pages)
+            large = page_count > self.large_document_pages
+            if large:
+                print(f"🐘 {page_count} pages: reading with bounded memory")
+            pages, chars, limit = [], 0, None
+            for number, page_text in enumerate(self.iter_pdf_pages(document, release=large), 1):
+                # Bounded buffer: text past max_text_chars is never kept
+                room = self.max_text_chars - chars
+                pages.append(page_text[:room])
+                chars += len(pages[-1])
+                if stream and number <= self.stream_probe_pages and self.is_resolved("".join(pages)):
+                    if number < page_count:
+                        print(f"⚡ Resolved after page {number} of {page_count}")
+                    return "".join(pages)
+                
+                rss = (current_rss_mb() or 0) if self.max_memory_mb else 0
+                if len(page_text) > room:
+                    limit = f"text is over {self.max_text_chars:,} characters by page {number} of {page_count}"
+                elif number == self.max_pages and number < page_count:
+                    limit = f"{page_count} pages is over the {self.max_pages}-page budget"
+                elif self.max_memory_mb and rss > self.max_memory_mb:
+                    limit = f"memory went over {self.max_memory_mb} MB ({rss:.0f} MB) at page {number} of {page_count}"
+                if limit:
+                    break
+            
+            text = "".join(pages)
+            if self.pdf_ocr and not self.is_resolved(text):
+                with stage('ocr'):
+                    text = self.ocr_pdf_pages(document, pages, stream)
+            if limit:
+                if not self.is_resolved(text):
+                    raise DocumentTooLarge(f"{limit}, and the pages read don't identify it")
+                print(f"✂️ Stopped reading: {limit}; the pages read were enough")
+            return text
+        except DocumentTooLarge:
+            raise
         except Exception as e:
             print(f"PDF extraction failed: {e}")
             return ""
     
+    def ocr_pdf_pages(self, document, pages, stream=True):
+        """OCR the pages of a PDF that have no usable text layer
+        
+        pages holds each page's extracted text. Pages with fewer than
+        min_page_chars characters are OCRed in parallel and their text
+        fills the gaps; in streaming mode OCR stops once the text resolves
+        the document. Returns the combined text.
+        """
+        blank = [index for index, text in enumerate(pages) if len(text.strip()) < self.min_page_chars]
+        if not blank:
+            return "".join(pages)
+        print(f"🖨️ {len(blank)} of {len(pages)} pages have no text layer: running OCR")
+        pages = list(pages)
+        texts = self.iter_ocr(document.page_image(index) for index in blank)
+        try:
+            for done, (index, text) in enumerate(zip(blank, texts), 1):
+                pages[index] = text[:self.max_text_chars]
+                if stream and self.is_resolved("".join(pages)):
+                    if done < len(blank):
+                        print(f"⚡ Resolved after OCR of {done} of {len(blank)} pages")
+                    break
+        finally:
+            # Cancels OCR queued for pages that are no longer needed
+            texts.close()
+        return "".join(pages)
+    
+    def submit_ocr(self, image):
+        """Prepare an image and queue it on the OCR engine: a Future of its text"""
+        preprocessor = self.image_preprocessor
+        image, dpi = preprocessor.prepare(preprocessor.reduce(image))
+        return self.ocr_engine.submit(image, config=preprocessor.tesseract_config(dpi))
+    
+    def iter_ocr(self, images):
+        """OCR images in parallel on the OCR engine and yield their text in order
+        
+        images is consumed lazily, two per OCR worker ahead of the text
+        being yielded, so only a few pages are in memory at a time. None
+        (a page with no image) and failed OCR yield "". Closing the
+        generator cancels OCR that hasn't started.
+        """
+        window = 2 * getattr(self.ocr_engine, 'workers', 1)
+        images = iter(images)
+        pending = deque()
+        try:
+            while True:
+                for image in images:
+                    pending.append(self.submit_ocr(image) if image is not None else None)
+                    if len(pending) >= window:
+                        break
+                if not pending:
+                    return
+                future = pending.popleft()
+                try:
+                    yield future.result() if future is not None else ""
+                except Exception as e:
+                    print(f"OCR extraction failed: {e}")
+                    yield ""
+        finally:
+            for future in pending:
+                if future is not None:
+                    future.cancel()
+    
     def extract_text_from_image(self, file_path):
-        """Extract text from image using OCR"""
+        """Extract text from image using OCR
+        
+        The image goes through the configured ImagePreprocessor first. With
+        header OCR enabled, only the top of the page is read unless that
+        leaves the type or client name unresolved; like early exit, that
+        means unwanted-document patterns below the header go unchecked.
+        Multi-page TIFFs are read frame by frame (see ocr_frames).
+        """
         try:
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
+            preprocessor = self.image_preprocessor
+            image = preprocessor.open(file_path)
+            if getattr(image, 'n_frames', 1) > 1:
+                with image:
+                    return self.ocr_frames(image)
+            image, dpi = preprocessor.prepare(image)
+            config = preprocessor.tesseract_config(dpi)
+            
+            if preprocessor.header_fraction:
+                header_text = self.ocr_engine.image_to_string(preprocessor.header_region(image), config=config)
+                if self.is_resolved(header_text):
+                    return header_text
+            
+            text = self.ocr_engine.image_to_string(image, config=config)
             return text
+        except DocumentTooLarge:
+            raise
         except Exception as e:
             print(f"OCR extraction failed: {e}")
             return ""
     
-    def classify_document(self, text):
-        """Classify document type based on content patterns"""
-        text_upper = text.upper()
-        
-        # RDL Detection
-        if ("DEPARTMENT OF VETERANS AFFAIRS" in text_upper and 
-            "RATING DECISION" in text_upper):
-            return "RDL"
+    def ocr_frames(self, image):
+        """OCR the frames of a multi-page image in parallel, in order
         
-        # RCS Detection  
-        if ("TM CLIENT AUTHORIZATION" in text_upper or
-            "TM-RCS-" in text_upper):
-            return "RCS"
+        Frames are decoded lazily as OCR workers free up, so only a few
+        are in memory at once. In streaming mode OCR stops once the text
+        resolves the document. Frames past max_pages aren't read; if the
+        ones read don't resolve the document, DocumentTooLarge is raised.
+        """
+        count = image.n_frames
+        print(f"📠 {count} frames: running OCR in parallel")
+        pages, chars = [], 0
+        texts = self.iter_ocr(iter_frames(image, self.max_pages))
+        try:
+            for text in texts:
+                pages.append(text[:self.max_text_chars - chars])
+                chars += len(pages[-1])
+                if self.stream_pages and self.is_resolved("".join(pages)):
+                    if len(pages) < count:
+                        print(f"⚡ Resolved after OCR of {len(pages)} of {count} frames")
+                    return "".join(pages)
+        finally:
+            # Cancels OCR queued for frames that are no longer needed
+            texts.close()
         
-        return "UNKNOWN"
+        text = "".join(pages)
+        if count > self.max_pages and not self.is_resolved(text):
+            raise DocumentTooLarge(f"{count} frames is over the {self.max_pages}-page budget, "
+                                   "and the frames read don't identify it")
+        return text
+    
+    def classify_document(self, text):
+        """Classify document type based on content patterns (see rules.py)"""
+        return self.rules.scan(text).doc_type
     
     def extract_client_info(self, text, doc_type):
         """Extract client name and ID based on document type"""
@@ -94,24 +493,22 @@ class DocumentProcessor:
         
         return None, None
     
-    def is_password_protected(self, file_path):
+    def match_client(self, client_name):
+        """Look up a client name in the roster: (client_id, confidence)"""
+        if self.roster is None or not client_name:
+            return None, 0.0
+        return self.roster.match(client_name)
+    
+    def is_password_protected(self, file_path, document=None):
         """Check if PDF is password protected"""
-        try:
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                return reader.is_encrypted
-        except:
-            return False
+        if document is None:
+            with self.open_document(file_path) as document:
+                return document.is_encrypted
+        return document.is_encrypted
     
     def is_unwanted_document(self, text):
         """Check for unwanted documents (driver's license, passport)"""
-        text_upper = text.upper()
-        unwanted_patterns = [
-            "DRIVER'S LICENSE", "DRIVERS LICENSE", "DL",
-            "PASSPORT", "BIRTH CERTIFICATE", 
-            "SOCIAL SECURITY CARD"
-        ]
-        return any(pattern in text_upper for pattern in unwanted_patterns)
+        return self.rules.scan(text).unwanted
     
     def generate_filename(self, doc_type, client_name, client_id, original_name):
         """Generate standardized filename: CLIENT_NAME_TYPE_OF_FILE.pdf"""
@@ -119,83 +516,486 @@ class DocumentProcessor:
         
         return f"{clean_name}_{doc_type}.pdf"
     
+    def place(self, file_path, dest):
+        """Put a file into the output library using the placement mode"""
+        with stage('place'):
+            return place_file(file_path, dest, self.placement)
+    
+    def handle_password_protected(self, file_path, client_email=None, client_name=None):
+        """Send a password-protected PDF to the review queue and notify"""
+        dest = self.output_dir / "REVIEW_NEEDED" / f"PASSWORD_PROTECTED_{file_path.name}"
+        self.place(file_path, dest)
+        
+        # Send real email notification if client info provided
+        if client_email and client_name:
+            print(f"📧 Sending password protection notification to {client_email}")
+            with stage('notify'):
+                self.email_service.send_password_protected_notification(
+                    client_email, client_name, file_path.name
+                )
+        
+        return "PASSWORD_PROTECTED", dest
+    
+    def handle_too_large(self, file_path, error):
+        """Send a document that went over the reading limits to review"""
+        print(f"🐘 {file_path.name} needs review: {error}")
+        dest = self.output_dir / "REVIEW_NEEDED" / f"TOO_LARGE_{file_path.name}"
+        self.place(file_path, dest)
+        return "TOO_LARGE", dest
+    
     def process_file(self, file_path, client_email=None, client_name=None):
         """Process a single document file"""
+        return self.process_file_detailed(file_path, client_email, client_name)['status']
+    
+    def process_file_detailed(self, file_path, client_email=None, client_name=None, content_hash=None):
+        """Process a single document file and return a result record:
+        {'file', 'status', 'output_path', 'seconds', 'stages', 'client_id',
+        'match_confidence'}, plus 'reason' for documents sent to review as
+        TOO_LARGE
+        
+        content_hash may pass in a SHA-256 the caller already computed (the
+        API hashes uploads while they stream in) to save hashing again.
+        'stages' holds the seconds spent in each pipeline stage; the record
+        is also counted in the metrics registry. client_id and
+        match_confidence come from the roster (None when nothing matched or
+        the document never got that far).
+        """
+        file_path = Path(file_path)
+        IN_FLIGHT.inc()
+        try:
+            with self._profiling(file_path):
+                analysis = self.analyse_file(file_path, content_hash)
+                return self.file_document(file_path, analysis, client_email, client_name)
+        finally:
+            IN_FLIGHT.dec()
+    
+    def _profiling(self, file_path):
+        return self.profiler.profile_file(file_path) if self.profiler is not None else nullcontext()
+    
+    def analyse_file(self, file_path, content_hash=None):
+        """First half of the pipeline: read and classify a file without
+        moving it. Returns a small, picklable analysis dict
+        {'file', 'outcome', 'doc_type', 'client_name', 'unwanted',
+        'content_hash', 'reason', 'seconds', 'stages'} for file_document()
+        
+        Batch workers run this part in parallel; the parent then files the
+        analyses one at a time in input order, so repeat names get their
+        _2, _3 ... suffixes in the same order whatever the worker count.
+        """
+        file_path = Path(file_path)
+        start = time.perf_counter()
+        with collect_stages() as stages:
+            try:
+                analysis = self._analyse(file_path, content_hash)
+            except DocumentTooLarge as e:
+                # The PDF is closed by now, so any placement mode works
+                analysis = {'outcome': "too_large", 'reason': str(e)}
+            except Exception:
+                record_document({'status': "ERROR", 'seconds': time.perf_counter() - start, 'stages': stages})
+                raise
+        analysis.update(file=file_path.name, seconds=time.perf_counter() - start, stages=dict(stages))
+        return analysis
+    
+    def file_document(self, file_path, analysis, client_email=None, client_name=None):
+        """Second half of the pipeline: match the client, place the file and
+        send notifications for an analyse_file() result; returns the record"""
+        file_path = Path(file_path)
+        start = time.perf_counter()
+        match = {'client_id': None, 'match_confidence': None}
+        with collect_stages() as stages:
+            for name, seconds in analysis['stages'].items():
+                stages[name] = seconds
+            try:
+                status, output_path = self._file(file_path, analysis, client_email, client_name, match)
+            except Exception:
+                record_document({'status': "ERROR", 'seconds': analysis['seconds'] + time.perf_counter() - start,
+                                 'stages': stages})
+                raise
+        
+        record = {
+            'file': file_path.name,
+            'status': status,
+            'output_path': str(output_path) if output_path else None,
+            'seconds': round(analysis['seconds'] + time.perf_counter() - start, 4),
+            'stages': {name: round(seconds, 4) for name, seconds in stages.items()},
+            **match
+        }
+        if analysis.get('reason'):
+            record['reason'] = analysis['reason']
+        record_document(record)
+        return record
+    
+    def _analyse(self, file_path, content_hash=None):
+        """Extract and classify one file: the analysis without timings"""
         print(f"Processing: {file_path.name}")
         
-        # Check if password protected
-        if file_path.suffix.lower() == '.pdf' and self.is_password_protected(file_path):
-            dest = self.output_dir / "REVIEW_NEEDED" / f"PASSWORD_PROTECTED_{file_path.name}"
-            shutil.copy2(file_path, dest)
+        suffix = file_path.suffix.lower()
+        if suffix != '.pdf' and suffix not in IMAGE_SUFFIXES:
+            return {'outcome': "unsupported"}
+        
+        # Same content seen before: reuse its text, type and client name
+        cached = None
+        if self.cache is not None:
+            if content_hash is None:
+                with stage('hash'):
+                    content_hash = hash_file(file_path)
+            with stage('cache'):
+                cached = self.cache.get(content_hash)
+        
+        if cached:
+            text, doc_type, client_name = cached
+            unwanted = self.is_unwanted_document(text)
+        else:
+            # Extract text (PDFs are parsed once and the reader is shared by
+            # the password check and the page-text extraction)
+            if suffix == '.pdf':
+                with stage('parse'):
+                    document = self.open_document(file_path)
+                with document:
+                    protected = self.is_password_protected(file_path, document)
+                    with stage('extract'):
+                        text = "" if protected else self.extract_text_from_pdf(file_path, document)
+                if protected:
+                    return {'outcome': "protected"}
+            else:
+                with stage('ocr'):
+                    text = self.extract_text_from_image(file_path)
             
-            # Send real email notification if client info provided
-            if client_email and client_name:
-                print(f"📧 Sending password protection notification to {client_email}")
-                self.email_service.send_password_protected_notification(
-                    client_email, client_name, file_path.name
-                )
+            with stage('classify'):
+                # Classify document and check for unwanted documents in one scan
+                verdict = self.rules.scan(text)
+                doc_type = verdict.doc_type
+                unwanted = verdict.unwanted
+                
+                # Extract client info
+                client_name, _ = self.extract_client_info(text, doc_type)
             
-            return "PASSWORD_PROTECTED"
+            # Empty text may be a transient extraction failure, so don't pin it
+            if self.cache is not None and content_hash and text:
+                with stage('cache'):
+                    self.cache.put(content_hash, text, doc_type, client_name)
         
-        # Extract text
-        if file_path.suffix.lower() == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
-        elif file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.tiff']:
-            text = self.extract_text_from_image(file_path)
-        else:
-            return "UNSUPPORTED_FORMAT"
+        return {'outcome': "document", 'doc_type': doc_type, 'client_name': client_name,
+                'unwanted': unwanted, 'content_hash': content_hash}
+    
+    def _file(self, file_path, analysis, client_email=None, client_name=None, match=None):
+        """Place one analysed file: (status, output path or None)
+        
+        The roster match is written into the match dict, if one is given.
+        """
+        outcome = analysis['outcome']
+        if outcome == "unsupported":
+            return "UNSUPPORTED_FORMAT", None
+        if outcome == "too_large":
+            return self.handle_too_large(file_path, analysis['reason'])
+        if outcome == "protected":
+            # Placed after the file is closed, so move mode works everywhere
+            return self.handle_password_protected(file_path, client_email, client_name)
+        
+        doc_type = analysis['doc_type']
+        client_name = analysis['client_name']
         
         # Check for unwanted documents
-        if self.is_unwanted_document(text):
+        if analysis['unwanted']:
             dest = self.output_dir / "REVIEW_NEEDED" / f"UNWANTED_{file_path.name}"
-            shutil.copy2(file_path, dest)
-            return "UNWANTED"
-        
-        # Classify document
-        doc_type = self.classify_document(text)
+            self.place(file_path, dest)
+            return "UNWANTED", dest
         
-        # Extract client info
-        client_name, client_id = self.extract_client_info(text, doc_type)
+        # Tie the extracted name to a known client account
+        with stage('match'):
+            client_id, confidence = self.match_client(client_name)
+        if match is not None:
+            match.update(client_id=client_id,
+                         match_confidence=confidence if self.roster is not None and client_name else None)
+        if client_id:
+            print(f"👤 Matched {client_name} to client {client_id} ({confidence:.0%})")
         
         if not client_name:
             # Move to review queue if can't extract client info
             dest = self.output_dir / "REVIEW_NEEDED" / f"NO_CLIENT_INFO_{file_path.name}"
-            shutil.copy2(file_path, dest)
-            return "NEEDS_REVIEW"
+            self.place(file_path, dest)
+            return "NEEDS_REVIEW", dest
         
-        # Generate new filename and move
+        # Generate new filename and move (a second document for the same
+        # client and type gets a _2, _3 ... suffix instead of overwriting)
+        folder = self.rules.folder_for(doc_type)
         new_filename = self.generate_filename(doc_type, client_name, client_id, file_path.name)
-        dest_dir = self.output_dir / doc_type
-        dest_path = dest_dir / new_filename
+        new_filename, dest_path = self.library.reserve(
+            folder, new_filename, analysis['content_hash'] or hash_file(file_path)
+        )
         
-        shutil.copy2(file_path, dest_path)
+        try:
+            self.place(file_path, dest_path)
+        except Exception:
+            self.library.release(folder, new_filename)
+            raise
         
         # Send completion notification if client info provided
         if client_email and client_name:
             print(f"📧 Sending completion notification to {client_email}")
-            self.email_service.send_processing_complete_notification(
-                client_email, client_name, file_path.name, new_filename, doc_type
-            )
+            with stage('notify'):
+                self.email_service.send_processing_complete_notification(
+                    client_email, client_name, file_path.name, new_filename, doc_type
+                )
+        
+        return f"PROCESSED_{doc_type}", dest_path
+    
+    def list_input_files(self):
+        """List files waiting in the input directory, sorted by name"""
+        return sorted(
+            (path for path in self.input_dir.iterdir() if path.is_file()),
+            key=lambda path: path.name
+        )
+    
+    def iter_process(self, files=None, workers=None, max_in_flight=None, journal=None,
+                     client_email=None, client_name=None):
+        """Yield a result record for each file, in input order
+        
+        client_email and client_name apply to every file (the API's batch
+        uploads come from one client). With a journal, every record is appended to it straight away and
+        files the journal already lists as done (same size and mtime) are
+        skipped, so an interrupted run resumes where it stopped. A file that
+        raises is reported with status ERROR instead of ending the run.
+        """
+        files = self.list_input_files() if files is None else [Path(path) for path in files]
+        signatures = {path.name: ProcessingJournal.signature(path) for path in files}
+        if journal is not None:
+            remaining = [path for path in files if not journal.is_done(path, signatures[path.name])]
+            if len(remaining) < len(files):
+                print(f"⏭️ Skipping {len(files) - len(remaining)} files already done in {journal.path}")
+            files = remaining
+        
+        workers = self.workers if workers is None else workers
+        if workers == 0:
+            workers = os.cpu_count() or 1
         
-        return f"PROCESSED_{doc_type}"
+        if workers > 1 and len(files) > 1:
+            records = self._iter_batch(files, workers, max_in_flight or self.max_in_flight,
+                                       client_email, client_name)
+        else:
+            records = (self._safe_process(path, client_email, client_name) for path in files)
+        
+        for record in records:
+            print(f"  → {record['file']}: {record['status']}")
+            if journal is not None:
+                journal.record(record, signatures.get(record['file']))
+            yield record
     
-    def process_all(self):
+    def _safe_process(self, file_path, client_email=None, client_name=None):
+        """process_file_detailed, reporting a crash as an ERROR record"""
+        try:
+            return self.process_file_detailed(file_path, client_email, client_name)
+        except Exception as e:
+            return self._error_record(file_path, e)
+    
+    def _error_record(self, file_path, error):
+        print(f"❌ Processing failed for {file_path.name}: {error}")
+        return {'file': file_path.name, 'status': "ERROR", 'output_path': None,
+                'seconds': None, 'error': str(error)}
+    
+    def process_all(self, workers=None, max_in_flight=None, journal=None):
         """Process all files in input directory"""
         results = {}
+        for record in self.iter_process(workers=workers, max_in_flight=max_in_flight, journal=journal):
+            results[record['file']] = record['status']
         
-        for file_path in self.input_dir.iterdir():
-            if file_path.is_file():
-                result = self.process_file(file_path)
-                results[file_path.name] = result
-                print(f"  → {result}")
+        # Same order whatever the worker count or completion order
+        return {name: results[name] for name in sorted(results)}
+    
+    def process_batch(self, files, workers, max_in_flight=None):
+        """Process files on a pool of worker processes: {filename: status}"""
+        return {record['file']: record['status'] for record in self._iter_batch(files, workers, max_in_flight)}
+    
+    def _iter_batch(self, files, workers, max_in_flight=None, client_email=None, client_name=None):
+        """Yield records from a pool of worker processes in input order,
+        keeping at most max_in_flight files queued (default: two per worker)
+        
+        Workers only analyse files; this process matches, places and
+        notifies, one file at a time in input order, so the library's
+        suffixes don't depend on which worker finished first.
+        """
+        max_in_flight = max(max_in_flight or workers * 2, workers)
+        # Analyses are small, so a slow file may hold back up to this many
+        # finished ones while the workers carry on
+        max_waiting = max_in_flight * 8
+        pending = {}
+        finished = {}
+        queue = enumerate(files)
+        next_index = 0
         
-        return results
+        with ProcessPoolExecutor(max_workers=workers, mp_context=batch_context(),
+                                 initializer=_init_worker, initargs=(self, workers)) as pool:
+            while True:
+                while len(pending) < max_in_flight and len(pending) + len(finished) < max_waiting:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    index, file_path = item
+                    future = pool.submit(_analyse_in_worker, file_path)
+                    pending[future] = (index, file_path)
+                    IN_FLIGHT.inc()
+                
+                if not pending and not finished:
+                    break
+                
+                if pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, file_path = pending.pop(future)
+                        try:
+                            finished[index] = (file_path, future.result(), None)
+                        except Exception as e:
+                            finished[index] = (file_path, None, e)
+                
+                while next_index in finished:
+                    file_path, analysis, error = finished.pop(next_index)
+                    next_index += 1
+                    try:
+                        if error is not None:
+                            # A worker's own metrics stay in its process, so count the record here
+                            record = self._error_record(file_path, error)
+                            record_document(record)
+                        else:
+                            profiles = analysis.pop('profiles', None)
+                            if profiles and self.profiler is not None:
+                                self.profiler.merge(profiles)
+                            record = self.file_document(file_path, analysis, client_email, client_name)
+                    except Exception as e:
+                        record = self._error_record(file_path, e)
+                    finally:
+                        IN_FLIGHT.dec()
+                    yield record
+
+def parse_args(argv=None):
+    """Command-line options for the document_processor entry point"""
+    parser = argparse.ArgumentParser(description="Sort uploaded documents into the processed library")
+    parser.add_argument("--input-dir", default="uploads", help="directory holding files to process")
+    parser.add_argument("--output-dir", default="processed", help="directory for the sorted library")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for batch mode (0 = one per CPU core)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="files queued to the worker pool at once (default: 2 x workers)")
+    parser.add_argument("--early-exit", action="store_true",
+                        help="stop reading pages and frames once type and client are known (faster, but "
+                             "ID documents later in a packet are not detected)")
+    parser.add_argument("--full-read", action="store_true",
+                        help="read every PDF page (the default; overrides --early-exit)")
+    parser.add_argument("--probe-pages", type=int, default=3,
+                        help="with --early-exit, pages to read before giving up and reading the rest")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="skip the content-hash result cache")
+    parser.add_argument("--raw-ocr", action="store_true",
+                        help="OCR images exactly as opened, without preprocessing")
+    parser.add_argument("--max-image-side", type=int, default=3000,
+                        help="scale images down so the longest side is at most this many pixels")
+    parser.add_argument("--binarize", action="store_true",
+                        help="threshold images to black and white before OCR")
+    parser.add_argument("--psm", type=int, default=None,
+                        help="Tesseract page segmentation mode")
+    parser.add_argument("--roster", default=None,
+                        help="CSV of known clients (client_id,name) to match extracted names against")
+    parser.add_argument("--placement", choices=PLACEMENT_MODES, default="copy",
+                        help="how files reach the output library (copy keeps the input)")
+    parser.add_argument("--layout", choices=LAYOUTS, default="flat",
+                        help="shard type folders by client-name hash or by date")
+    parser.add_argument("--ocr-workers", type=int, default=0,
+                        help="run OCR on this many long-lived worker processes (0 = tesseract per image)")
+    parser.add_argument("--header-ocr", type=float, default=None, metavar="FRACTION",
+                        help="OCR only the top FRACTION of each image first, e.g. 0.25 (faster, but "
+                             "ID documents below the header are not detected)")
+    parser.add_argument("--journal", default=None,
+                        help="JSONL journal of results (default: <output-dir>/processing_journal.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip files the journal already records as done")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and process new files as they arrive in the input directory")
+    parser.add_argument("--poll", action="store_true",
+                        help="watch by polling instead of inotify")
+    parser.add_argument("--poll-interval", type=float, default=2.0,
+                        help="seconds between directory polls in watch mode")
+    parser.add_argument("--large-pages", type=int, default=100,
+                        help="PDFs with more pages than this are read with bounded memory")
+    parser.add_argument("--max-pages", type=int, default=500,
+                        help="most pages read from one PDF before it goes to review unclassified")
+    parser.add_argument("--max-text-chars", type=int, default=5_000_000,
+                        help="most characters of text kept from one document")
+    parser.add_argument("--max-memory-mb", type=int, default=None,
+                        help="stop reading a PDF once the process uses this much memory")
+    parser.add_argument("--no-pdf-ocr", action="store_true",
+                        help="don't OCR PDF pages that have no text layer")
+    parser.add_argument("--no-outbox", action="store_true",
+                        help="send notifications inline instead of through the background outbox")
+    parser.add_argument("--mail-wait", type=float, default=60.0,
+                        help="seconds to wait at the end of a run for queued notifications to send")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile CPU time and memory per file and report the slowest files and hottest functions")
+    parser.add_argument("--profile-dir", default=None,
+                        help="where --profile writes run.prof and report.json (default: <output-dir>/profile)")
+    parser.add_argument("--profile-no-memory", action="store_true",
+                        help="profile CPU time only, without tracemalloc")
+    return parser.parse_args(argv)
+
+def report_profile(profiler, directory):
+    print()
+    print(profiler.format_report())
+    print(f"\n💾 Profile written to {profiler.dump(directory)} (open run.prof with pstats or snakeviz)")
 
 if __name__ == "__main__":
-    processor = DocumentProcessor()
+    args = parse_args()
+    if args.raw_ocr:
+        image_preprocessor = ImagePreprocessor.raw()
+    else:
+        image_preprocessor = ImagePreprocessor(
+            max_side=args.max_image_side, binarize=args.binarize,
+            psm=args.psm, header_fraction=args.header_ocr
+        )
+    roster = None
+    if args.roster:
+        roster = ClientRoster()
+        print(f"👥 Loaded {roster.load_csv(args.roster)} clients from {args.roster}")
+    processor = DocumentProcessor(
+        args.input_dir, args.output_dir,
+        workers=args.workers, max_in_flight=args.max_in_flight,
+        stream_pages=args.early_exit and not args.full_read, stream_probe_pages=args.probe_pages,
+        cache=not args.no_cache, image_preprocessor=image_preprocessor,
+        ocr_engine=PooledOcrEngine(args.ocr_workers) if args.ocr_workers else None,
+        roster=roster, placement=args.placement, layout=args.layout,
+        outbox=not args.no_outbox,
+        large_document_pages=args.large_pages, max_pages=args.max_pages,
+        max_text_chars=args.max_text_chars, max_memory_mb=args.max_memory_mb,
+        pdf_ocr=not args.no_pdf_ocr,
+        profiler=RunProfiler(memory=not args.profile_no_memory) if args.profile else None
+    )
+    profile_dir = args.profile_dir or Path(args.output_dir) / "profile"
+    journal = ProcessingJournal(
+        args.journal or Path(args.output_dir) / "processing_journal.jsonl",
+        resume=args.resume or args.watch
+    )
+    
+    if args.watch:
+        watcher = FolderWatcher(processor, journal, poll_interval=args.poll_interval,
+                                use_inotify=False if args.poll else None)
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            print("\n👋 Stopped watching.")
+        if processor.profiler is not None:
+            report_profile(processor.profiler, profile_dir)
+        raise SystemExit(0)
+    
     print("🚀 Starting Document Processing...")
-    results = processor.process_all()
+    results = processor.process_all(journal=journal)
     
     print("\n📊 Processing Summary:")
     for filename, status in results.items():
-        print(f"  {filename}: {status}")
\ No newline at end of file
+        print(f"  {filename}: {status}")
+    
+    if processor.profiler is not None:
+        report_profile(processor.profiler, profile_dir)
+    
+    outbox = processor.email_service.outbox
+    if outbox is not None:
+        outbox.stop()
+        pending = outbox.flush(timeout=args.mail_wait)
+        if pending:
+            print(f"📬 {pending} notifications still queued in {outbox.path}; they go out on the next run")
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Email Outbox - durable queue of notifications sent in the background
+Processing only writes a row to SQLite; a sender thread delivers queued
+emails and retries failures with exponential backoff, so a slow or down
+SMTP server never holds up documents and no notification is dropped.
+Notifications to one recipient within a time window are combined into a
+single digest, and a token bucket keeps sending under the mail quota
+"""
+
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+OUTBOX_STATES = ('pending', 'sending', 'sent', 'failed')
+
+class TokenBucket:
+    """Allows `rate` sends per second on average, in bursts of `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        """Whole tokens that can be taken right now"""
+        with self._lock:
+            self._refill()
+            return int(self.tokens)
+
+    def take(self):
+        """Use a token if there is one"""
+        with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def wait_time(self):
+        """Seconds until the next token"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+def is_permanent(error):
+    """True for SMTP errors that retrying won't fix (5xx replies)"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600 and not isinstance(error, smtplib.SMTPAuthenticationError)
+    return False
+
+class EmailOutbox:
+    def __init__(self, path, email_service, max_attempts=8, base_delay=30.0, max_delay=3600.0,
+                 poll_interval=5.0, lease=300.0, keep_sent=7 * 24 * 3600, digest_window=0.0,
+                 digest_max=100, rate_per_hour=None, burst=20):
+        self.path = Path(path)
+        self.email_service = email_service
+        # Notifications for one recipient are held this many seconds from
+        # the first one and sent as a single digest (0 = send each alone);
+        # a digest goes early once digest_max notifications have piled up
+        self.digest_window = digest_window
+        self.digest_max = digest_max
+        # Sending rate limit (None = unlimited). Emails over the limit wait
+        # in the outbox; they are never dropped
+        self.rate_per_hour = rate_per_hour
+        self.burst = burst
+        self._bucket = TokenBucket(rate_per_hour / 3600, burst) if rate_per_hour else None
+        # Retry schedule: base_delay, doubling per attempt up to max_delay
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # How often the sender looks for rows queued by other processes
+        self.poll_interval = poll_interval
+        # A 'sending' row older than this was claimed by a sender that died
+        self.lease = lease
+        self.keep_sent = keep_sent
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._running = False
+
+    def __getstate__(self):
+        # Connections and the sender thread stay in their own process;
+        # worker processes only queue rows for the parent's sender
+        state = self.__dict__.copy()
+        for name in ('_lock', '_conn', '_pid', '_wake', '_thread', '_bucket'):
+            state[name] = None
+        state['_running'] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        if self.rate_per_hour:
+            self._bucket = TokenBucket(self.rate_per_hour / 3600, self.burst)
+
+    def _connection(self):
+        """Open the database on first use (once per process)"""
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    to_email TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    is_html INTEGER NOT NULL DEFAULT 0,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    last_error TEXT,
+                    created REAL NOT NULL,
+                    sent REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt)")
+            # Notifications waiting to be combined into a digest
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    to_email TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS events_recipient ON events (to_email, created)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def enqueue(self, to_email, subject, message, is_html=False):
+        """Queue an email for the background sender; returns its outbox ID"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(
+                "INSERT INTO outbox (to_email, subject, message, is_html, state, next_attempt, created) "
+                "VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                (to_email, subject, message, int(is_html), now, now)
+            )
+            conn.commit()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def take_token(self):
+        """Count an email sent outside the outbox against the rate limit;
+        False if the limit leaves no send for it right now"""
+        return self._bucket is None or self._bucket.take()
+
+    def add_event(self, to_email, subject, message, summary):
+        """Queue a notification that may be combined with others to the same
+        recipient; `summary` is its line in the digest"""
+        if not self.digest_window:
+            return self.enqueue(to_email, subject, message)
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(
+                "INSERT INTO events (to_email, subject, message, summary, created) VALUES (?, ?, ?, ?, ?)",
+                (to_email, subject, message, summary, time.time())
+            )
+            conn.commit()
+        self._wake.set()
+        return cursor.lastrowid
+
+    def coalesce(self, force=False):
+        """Turn each recipient's held notifications into one email once its
+        window has passed (all of them with force); returns emails queued"""
+        now = time.time()
+        queued = 0
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                recipients = conn.execute(
+                    "SELECT to_email FROM events GROUP BY to_email "
+                    "HAVING ? OR MIN(created) <= ? OR COUNT(*) >= ?",
+                    (force, now - self.digest_window, self.digest_max)
+                ).fetchall()
+                for (to_email,) in recipients:
+                    events = conn.execute(
+                        "SELECT id, subject, message, summary FROM events WHERE to_email = ? ORDER BY id",
+                        (to_email,)
+                    ).fetchall()
+                    if len(events) == 1:
+                        subject, message = events[0][1], events[0][2]
+                    else:
+                        subject, message = self.email_service.render_digest([event[3] for event in events])
+                    conn.execute(
+                        "INSERT INTO outbox (to_email, subject, message, is_html, state, next_attempt, created) "
+                        "VALUES (?, ?, ?, 0, 'pending', ?, ?)",
+                        (to_email, subject, message, now, now)
+                    )
+                    conn.executemany("DELETE FROM events WHERE id = ?", [(event[0],) for event in events])
+                    queued += 1
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return queued
+
+    def backoff(self, attempts):
+        """Seconds before retry number `attempts`, with +-10% jitter so
+        failures that happened together don't retry together"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.9, 1.1)
+
+    def _claim(self, limit=20):
+        """Mark up to `limit` due emails as being sent by this process"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Emails a crashed sender was in the middle of are due again
+                conn.execute(
+                    "UPDATE outbox SET state = 'pending' WHERE state = 'sending' AND next_attempt < ?",
+                    (now - self.lease,)
+                )
+                rows = conn.execute(
+                    "SELECT id, to_email, subject, message, is_html, attempts FROM outbox "
+                    "WHERE state = 'pending' AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE outbox SET state = 'sending', next_attempt = ? WHERE id = ?",
+                    [(now, row[0]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def _update(self, email_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(f"UPDATE outbox SET {columns} WHERE id = ?", (*fields.values(), email_id))
+            conn.commit()
+
+    def send_due(self, force_digests=False):
+        """Try every email that is due now, as far as the rate limit allows;
+        returns how many were sent"""
+        self.coalesce(force_digests)
+        sent = 0
+        while True:
+            limit = 20 if self._bucket is None else min(20, self._bucket.available())
+            rows = self._claim(limit) if limit else []
+            if not rows:
+                return sent
+            for email_id, to_email, subject, message, is_html, attempts in rows:
+                if self._bucket is not None:
+                    self._bucket.take()
+                attempts += 1
+                try:
+                    self.email_service.deliver(to_email, subject, message, bool(is_html))
+                except Exception as e:
+                    if is_permanent(e) or attempts >= self.max_attempts:
+                        print(f"❌ Giving up on email {email_id} to {to_email} after {attempts} attempts: {e}")
+                        self._update(email_id, state='failed', attempts=attempts, last_error=str(e))
+                    else:
+                        delay = self.backoff(attempts)
+                        print(f"⏳ Email {email_id} to {to_email} failed ({e}), retrying in {delay:.0f}s")
+                        self._update(email_id, state='pending', attempts=attempts, last_error=str(e),
+                                     next_attempt=time.time() + delay)
+                else:
+                    print(f"✅ Email sent successfully to {to_email}")
+                    self._update(email_id, state='sent', attempts=attempts, sent=time.time())
+                    sent += 1
+
+    def next_due(self):
+        """Seconds until the next email or digest is due (None if nothing
+        is waiting), allowing for the rate limit"""
+        with self._lock:
+            conn = self._connection()
+            email_due = conn.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE state = 'pending'"
+            ).fetchone()[0]
+            first_event = conn.execute("SELECT MIN(created) FROM events").fetchone()[0]
+        due = [when for when in (email_due, first_event and first_event + self.digest_window) if when]
+        if not due:
+            return None
+        wait = max(0.0, min(due) - time.time())
+        if wait == 0 and email_due is not None and self._bucket is not None:
+            # Due now but over the rate limit: wake when a token is free
+            wait = self._bucket.wait_time()
+        return wait
+
+    def purge(self):
+        """Forget sent emails older than keep_sent"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM outbox WHERE state = 'sent' AND sent < ?", (time.time() - self.keep_sent,))
+            conn.commit()
+
+    def start(self):
+        """Start the background sender (once per process)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        self.purge()
+        while self._running:
+            try:
+                self.send_due()
+                next_due = self.next_due()
+            except Exception as e:
+                print(f"❌ Email outbox error: {e}")
+                next_due = None
+            wait = self.poll_interval if next_due is None else min(next_due, self.poll_interval)
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def flush(self, timeout=60):
+        """Send what is due now, including digests whose window hasn't
+        closed, and wait for retries and the rate limit up to `timeout`
+        seconds; returns how many emails are still pending"""
+        deadline = time.monotonic() + timeout
+        while True:
+            self.send_due(force_digests=True)
+            next_due = self.next_due()
+            if next_due is None or time.monotonic() + next_due > deadline:
+                break
+            time.sleep(next_due)
+        return self.counts()['pending']
+
+    def counts(self):
+        """Number of emails in each state, plus notifications held for digests"""
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall()
+            held = conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+        counts = {state: 0 for state in OUTBOX_STATES}
+        counts.update(dict(rows))
+        counts['held'] = held
+        return counts
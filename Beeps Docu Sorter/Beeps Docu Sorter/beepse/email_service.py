@@ -1,18 +1,25 @@
 #!/usr/bin/env python3
 """
 Gmail Email Service for Document Processing System
-Sends real emails via Gmail SMTP
+Sends real emails via Gmail SMTP, over a small pool of kept-alive
+connections shared by every thread using the service. With an outbox
+attached, notifications are queued and sent in the background
 """
 
 import smtplib
 import os
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 from pathlib import Path
+from email_outbox import EmailOutbox
+from metrics import EMAIL_SECONDS, EMAILS
+from smtp_pool import SmtpConnectionPool
 
 class EmailService:
-    def __init__(self):
+    def __init__(self, pool_size=None):
         # Email configuration - UPDATE THESE WITH YOUR DETAILS
         self.smtp_server = "smtp.gmail.com"
         self.smtp_port = 587
@@ -28,29 +35,139 @@ class EmailService:
         self.admin_email = os.getenv('ADMIN_EMAIL', self.admin_email)
         self.gmail_user = os.getenv('GMAIL_USER', self.gmail_user)
         self.gmail_password = os.getenv('GMAIL_PASSWORD', self.gmail_password)
+        
+        # Another server (e.g. smtp_sink.py for offline testing)
+        self.smtp_server = os.getenv('SMTP_SERVER', self.smtp_server)
+        self.smtp_port = int(os.getenv('SMTP_PORT', self.smtp_port))
+        self.smtp_starttls = os.getenv('SMTP_STARTTLS', '1') != '0'
+        
+        # Most SMTP connections kept open at once (Gmail allows a handful)
+        self.pool_size = pool_size or int(os.getenv('SMTP_POOL_SIZE', '2'))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Durable queue send_email hands emails to (see use_outbox)
+        self.outbox = None
+    
+    def __getstate__(self):
+        # Sockets and locks stay in the process that opened them (batch
+        # workers get a copy of the processor, and open their own pool)
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pool_lock'] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+    
+    def connection_pool(self):
+        """The shared pool, rebuilt if the server or credentials have changed"""
+        key = (self.smtp_server, self.smtp_port, self.gmail_user, self.gmail_password, self.smtp_starttls)
+        with self._pool_lock:
+            pool = self._pool
+            if pool is None or (pool.host, pool.port, pool.user, pool.password, pool.starttls) != key:
+                if pool is not None:
+                    pool.close()
+                pool = self._pool = SmtpConnectionPool(*key, size=self.pool_size)
+            return pool
+    
+    def use_outbox(self, path, **options):
+        """Queue emails from send_email in a SQLite outbox at `path`; returns
+        the outbox, whose start() runs the background sender"""
+        # Digest window (seconds) and sending limit, unless given: Gmail
+        # allows about 2,000 emails a day, so 80 an hour stays under it
+        options.setdefault('digest_window', float(os.getenv('DIGEST_WINDOW', '300')))
+        options.setdefault('rate_per_hour', float(os.getenv('MAIL_RATE_PER_HOUR', '80')) or None)
+        options.setdefault('burst', int(os.getenv('MAIL_BURST', '20')))
+        self.outbox = EmailOutbox(path, self, **options)
+        return self.outbox
+    
+    def close(self):
+        """Close pooled connections (they reopen on the next send)"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+    
+    def _send_over_pool(self, to_email, text):
+        """Send over a pooled connection, reconnecting once if it was dropped"""
+        pool = self.connection_pool()
+        for attempt in range(2):
+            server = pool.acquire()
+            try:
+                server.sendmail(self.gmail_user, to_email, text)
+            except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                # The server answered, so the connection itself is fine
+                pool.release(server)
+                raise
+            except (smtplib.SMTPServerDisconnected, OSError):
+                pool.release(server, broken=True)
+                if attempt:
+                    raise
+                print("🔁 SMTP connection dropped, reconnecting")
+            else:
+                pool.release(server)
+                return
+    
+    def deliver(self, to_email, subject, message, is_html=False):
+        """Send one email now, raising if it fails"""
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = self.gmail_user
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        # Add body
+        msg.attach(MIMEText(message, 'html' if is_html else 'plain'))
+        
+        # Send email over a pooled Gmail SMTP connection
+        start = time.perf_counter()
+        try:
+            self._send_over_pool(to_email, msg.as_string())
+        except Exception:
+            EMAILS.inc(result='failed')
+            raise
+        EMAIL_SECONDS.observe(time.perf_counter() - start)
+        EMAILS.inc(result='sent')
     
     def send_email(self, to_email, subject, message, is_html=False):
-        """Send email via Gmail SMTP"""
+        """Send email via Gmail SMTP (queued, if an outbox is attached)"""
+        if self.outbox is not None:
+            email_id = self.outbox.enqueue(to_email, subject, message, is_html)
+            print(f"📬 Email {email_id} to {to_email} queued")
+            return True
+        return self.send_now(to_email, subject, message, is_html)
+    
+    def notify(self, to_email, subject, message, summary):
+        """Send a notification that may go out in a digest with others to
+        the same recipient; `summary` is its one-line digest entry"""
+        if self.outbox is not None:
+            self.outbox.add_event(to_email, subject, message, summary)
+            print(f"📬 Notification to {to_email} queued")
+            return True
+        return self.send_now(to_email, subject, message)
+    
+    def render_digest(self, summaries):
+        """Subject and body of one email standing in for several notifications"""
+        lines = "\n".join(f"• {summary}" for summary in summaries)
+        subject = f"Document Processing Summary - {len(summaries)} updates"
+        message = f"""
+Hello,
+
+Here is a summary of {len(summaries)} document updates:
+
+{lines}
+
+⏰ SENT: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+Document Processing System 💖
+        """
+        return subject, message
+    
+    def send_now(self, to_email, subject, message, is_html=False):
+        """Send email via Gmail SMTP, bypassing the outbox"""
         try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.gmail_user
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            # Add body
-            msg.attach(MIMEText(message, 'html' if is_html else 'plain'))
-            
-            # Connect to Gmail SMTP
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()  # Enable encryption
-            server.login(self.gmail_user, self.gmail_password)
-            
-            # Send email
-            text = msg.as_string()
-            server.sendmail(self.gmail_user, to_email, text)
-            server.quit()
-            
+            self.deliver(to_email, subject, message, is_html)
             print(f"✅ Email sent successfully to {to_email}")
             return True
             
@@ -105,8 +222,10 @@ Document Quality Team System 💖
         """
         
         # Send both emails
-        client_sent = self.send_email(client_email, client_subject, client_message)
-        admin_sent = self.send_email(self.admin_email, admin_subject, admin_message)
+        client_sent = self.notify(client_email, client_subject, client_message,
+                                  f'🔒 "{filename}" is password-protected - please resubmit it without a password')
+        admin_sent = self.notify(self.admin_email, admin_subject, admin_message,
+                                 f'🔒 {filename} from {client_name} ({client_email}) is password-protected')
         
         return client_sent and admin_sent
     
@@ -155,8 +274,10 @@ Document Quality Team System 💖
         """
         
         # Send both emails
-        client_sent = self.send_email(client_email, client_subject, client_message)
-        admin_sent = self.send_email(self.admin_email, admin_subject, admin_message)
+        client_sent = self.notify(client_email, client_subject, client_message,
+                                  f'❌ "{filename}" could not be processed - please resubmit it')
+        admin_sent = self.notify(self.admin_email, admin_subject, admin_message,
+                                 f'❌ {filename} from {client_name} ({client_email}): {error_details}')
         
         return client_sent and admin_sent
     
@@ -182,7 +303,8 @@ Thank you for using our document processing service!
 Document Processing System 💖
         """
         
-        return self.send_email(client_email, client_subject, client_message)
+        return self.notify(client_email, client_subject, client_message,
+                           f'✅ "{filename}" processed as {processed_filename} ({doc_type})')
     
     def test_email_connection(self):
         """Test email connection and send test email"""
@@ -202,7 +324,7 @@ Document Processing System 💖
         """
         
         print("🧪 Testing email connection...")
-        success = self.send_email(self.admin_email, test_subject, test_message)
+        success = self.send_now(self.admin_email, test_subject, test_message)
         
         if success:
             print("✅ Email test successful! Check your inbox.")
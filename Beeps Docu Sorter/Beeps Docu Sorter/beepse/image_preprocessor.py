@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Image Preprocessor - prepares scans and phone photos for Tesseract
+Draft-mode JPEG decoding, grayscale/binarisation, resolution capping,
+DPI normalisation and header-region cropping
+"""
+
+from PIL import Image
+
+class ImagePreprocessor:
+    def __init__(self, draft=True, grayscale=True, binarize=False, threshold=160,
+                 max_side=3000, default_dpi=300, psm=None, header_fraction=None):
+        # Decode JPEGs at a reduced scale straight from the DCT data
+        self.draft = draft
+        # Tesseract works on luminance; colour only costs decode and memory
+        self.grayscale = grayscale
+        self.binarize = binarize
+        self.threshold = threshold
+        # Longest side in pixels; 24 MP phone photos are scaled down to this
+        self.max_side = max_side
+        # DPI passed to Tesseract when the image doesn't record one
+        self.default_dpi = default_dpi
+        # Tesseract page segmentation mode (None = Tesseract default)
+        self.psm = psm
+        # OCR only the top fraction of the image first (None = off)
+        self.header_fraction = header_fraction
+
+    @classmethod
+    def raw(cls):
+        """A preprocessor that leaves images exactly as Image.open returns them"""
+        return cls(draft=False, grayscale=False, binarize=False, max_side=None,
+                   default_dpi=None, psm=None, header_fraction=None)
+
+    def signature(self):
+        """Short description of the settings, used in result cache keys"""
+        return (f"d{int(self.draft)}g{int(self.grayscale)}b{int(self.binarize)}:{self.threshold}"
+                f"m{self.max_side}p{self.psm}h{self.header_fraction}")
+
+    def open(self, file_path):
+        """Open an image, letting JPEGs decode at reduced size when allowed"""
+        return self.reduce(Image.open(file_path))
+
+    def reduce(self, image):
+        """Let an opened but not yet decoded JPEG decode at reduced size"""
+        if self.draft and image.format == 'JPEG' and self.max_side:
+            scale = self.max_side / max(image.size)
+            if scale < 1:
+                original_width = image.width
+                image.draft('L' if self.grayscale else 'RGB',
+                            (int(image.width * scale), int(image.height * scale)))
+                if image.info.get('dpi'):
+                    factor = image.width / original_width
+                    image.info['dpi'] = tuple(value * factor for value in image.info['dpi'])
+        return image
+
+    def prepare(self, image):
+        """Return (image, dpi) ready for OCR"""
+        original_width = image.width
+        dpi = image.info.get('dpi', (0, 0))[0] or None
+
+        if self.grayscale and image.mode != 'L':
+            image = image.convert('L')
+
+        if self.max_side and max(image.size) > self.max_side:
+            image = image.copy()
+            image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+        if self.binarize:
+            if image.mode != 'L':
+                image = image.convert('L')
+            table = [0 if value < self.threshold else 255 for value in range(256)]
+            image = image.point(table)
+
+        # Keep the recorded DPI in step with any scaling done above
+        if dpi:
+            dpi = int(dpi * image.width / original_width)
+        elif self.default_dpi:
+            dpi = self.default_dpi
+        return image, dpi
+
+    def header_region(self, image):
+        """Crop the top of the page where letterheads and form titles live"""
+        height = max(1, int(image.height * self.header_fraction))
+        return image.crop((0, 0, image.width, height))
+
+    def tesseract_config(self, dpi=None):
+        """Extra command-line options for pytesseract"""
+        options = []
+        if self.psm is not None:
+            options.append(f"--psm {self.psm}")
+        if dpi:
+            options.append(f"--dpi {dpi}")
+        return " ".join(options)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Job Queue - runs document processing in the background for the API
+Uploads are persisted and queued; the HTTP request returns a job ID at
+once and clients poll the job's status
+"""
+
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+
+class JobQueue:
+    def __init__(self, processor, store_dir="job_store", workers=2):
+        self.processor = processor
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.store_dir / "jobs.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                path TEXT NOT NULL,
+                client_email TEXT,
+                client_name TEXT,
+                content_hash TEXT,
+                result TEXT,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if 'content_hash' not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN content_hash TEXT")
+        self._conn.commit()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+        self.recover()
+
+    def job_dir(self, job_id):
+        return self.store_dir / job_id
+
+    def new_job(self):
+        """Reserve a job ID and its upload directory"""
+        job_id = uuid.uuid4().hex
+        self.job_dir(job_id).mkdir(parents=True)
+        return job_id
+
+    def submit(self, job_id, path, client_email=None, client_name=None, content_hash=None):
+        """Queue a persisted upload for processing"""
+        path = Path(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, state, filename, path, client_email, client_name, content_hash, created) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, path.name, str(path), client_email, client_name, content_hash, time.time())
+            )
+            self._conn.commit()
+        self._pool.submit(self._run, job_id)
+        return job_id
+
+    def recover(self):
+        """Re-queue jobs a previous server process accepted but never finished"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE state IN ('queued', 'running') ORDER BY created"
+            ).fetchall()
+            self._conn.execute("UPDATE jobs SET state = 'queued', started = NULL WHERE state = 'running'")
+            self._conn.commit()
+        for (job_id,) in rows:
+            self._pool.submit(self._run, job_id)
+        if rows:
+            print(f"🔁 Re-queued {len(rows)} unfinished jobs")
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def _run(self, job_id):
+        """Process one job on a worker thread"""
+        with self._lock:
+            # Claimed in one statement, so a job re-queued by two processes
+            # (the debug reloader runs recover() twice) only runs once
+            claimed = self._conn.execute(
+                "UPDATE jobs SET state = 'running', started = ? WHERE id = ? AND state = 'queued'",
+                (time.time(), job_id)
+            ).rowcount
+            self._conn.commit()
+            if not claimed:
+                return
+            row = self._conn.execute(
+                "SELECT path, client_email, client_name, content_hash FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        path, client_email, client_name, content_hash = row
+
+        try:
+            record = self.processor.process_file_detailed(
+                path, client_email=client_email, client_name=client_name, content_hash=content_hash
+            )
+            self._update(job_id, state='done', result=json.dumps(record), finished=time.time())
+        except Exception as e:
+            print(f"❌ Job {job_id} failed: {e}")
+            self._update(job_id, state='failed', error=str(e), finished=time.time())
+        finally:
+            # The processed library has its own copy now
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def status(self, job_id):
+        """Job status for the API, or None if the ID is unknown"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, filename, result, error, created, started, finished FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            state, filename, result, error, created, started, finished = row
+            position = None
+            if state == 'queued':
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE state = 'queued' AND created < ?", (created,)
+                ).fetchone()[0]
+
+        status = {
+            'jobId': job_id,
+            'state': state,
+            'filename': filename,
+            'queuePosition': position,
+            'createdAt': created,
+            'startedAt': started,
+            'finishedAt': finished,
+        }
+        if result:
+            record = json.loads(result)
+            status['result'] = record['status']
+            status['outputPath'] = record['output_path']
+            status['seconds'] = record['seconds']
+            status['clientId'] = record.get('client_id')
+            status['matchConfidence'] = record.get('match_confidence')
+        if error:
+            status['error'] = error
+        return status
+
+    def counts(self):
+        """Number of jobs in each state"""
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(dict(rows))
+        return counts
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Processing Journal - append-only JSONL record of every processed file
+Written as each file finishes, so an interrupted run can resume where it
+stopped and downstream tools can tail results live
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Statuses that mean a file needs another attempt on resume
+RETRY_STATUSES = {"ERROR"}
+
+class ProcessingJournal:
+    def __init__(self, path, resume=True, fsync=False):
+        self.path = Path(path)
+        # fsync each line: survives power loss, costs a disk flush per file
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._file = None
+        # resume=False still appends to the journal but treats nothing as done
+        self.entries = self.load() if resume else {}
+
+    def load(self):
+        """Latest entry per file name from an existing journal"""
+        entries = {}
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    entries[entry['file']] = entry
+        return entries
+
+    @staticmethod
+    def signature(file_path):
+        """(size, mtime_ns) identifying one version of a file, or None"""
+        try:
+            stat = Path(file_path).stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def is_done(self, file_path, signature=None):
+        """True if this version of the file already finished successfully"""
+        entry = self.entries.get(Path(file_path).name)
+        if entry is None or entry['status'] in RETRY_STATUSES:
+            return False
+        signature = signature or self.signature(file_path)
+        return signature is not None and (entry.get('size'), entry.get('mtime_ns')) == tuple(signature)
+
+    def record(self, record, signature=None):
+        """Append a result record (plus the file's size/mtime) and flush it"""
+        entry = dict(record)
+        if signature:
+            entry['size'], entry['mtime_ns'] = signature
+        entry.setdefault('time', time.time())
+        line = json.dumps(entry) + "\n"
+
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.entries[entry['file']] = entry
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Library Layout - where processed documents live on disk
+Shards each type folder by client-name hash or date, gives repeat names
+deterministic _2, _3 ... suffixes and keeps a SQLite index from logical
+names to physical paths
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+LAYOUTS = ('flat', 'hash', 'date')
+
+class Library:
+    def __init__(self, output_dir, layout='flat', index_path=None):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown library layout: {layout}")
+        self.output_dir = Path(output_dir)
+        self.layout = layout
+        self.index_path = Path(index_path) if index_path else self.output_dir / "library_index.sqlite3"
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def __getstate__(self):
+        # Connections can't cross process boundaries; each worker reconnects
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        state['_conn'] = None
+        state['_pid'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Open the index on first use (once per process)"""
+        if self._conn is None or self._pid != os.getpid():
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.index_path), timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    logical TEXT NOT NULL,
+                    folder TEXT NOT NULL,
+                    base TEXT NOT NULL,
+                    physical TEXT NOT NULL,
+                    content_hash TEXT,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (folder, logical)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_base ON entries (folder, base, content_hash)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS counters (
+                    folder TEXT NOT NULL,
+                    base TEXT NOT NULL,
+                    used INTEGER NOT NULL,
+                    PRIMARY KEY (folder, base)
+                )
+            """)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def shard_for(self, base_name):
+        """Sub-directory for a file name under the current layout"""
+        if self.layout == 'hash':
+            digest = hashlib.sha1(base_name.encode('utf-8')).hexdigest()
+            return Path(digest[:2]) / digest[2:4]
+        if self.layout == 'date':
+            return Path(datetime.now().strftime('%Y')) / datetime.now().strftime('%m')
+        return Path()
+
+    def reserve(self, folder, base_name, content_hash=None):
+        """Claim a logical name for a new document: (logical_name, path)
+
+        The first document with a base name gets it unchanged; later ones get
+        _2, _3, ... in arrival order, skipping names already taken on disk.
+        The same content filed again under the same base name gets its
+        existing entry back instead of a new copy.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if content_hash:
+                    row = conn.execute(
+                        "SELECT logical, physical FROM entries WHERE folder = ? AND base = ? AND content_hash = ?",
+                        (folder, base_name, content_hash)
+                    ).fetchone()
+                    if row:
+                        conn.execute("COMMIT")
+                        return row[0], self.output_dir / row[1]
+
+                row = conn.execute(
+                    "SELECT used FROM counters WHERE folder = ? AND base = ?", (folder, base_name)
+                ).fetchone()
+                number = row[0] + 1 if row else 1
+                stem, suffix = os.path.splitext(base_name)
+                while True:
+                    logical = base_name if number == 1 else f"{stem}_{number}{suffix}"
+                    physical = Path(folder) / self.shard_for(base_name) / logical
+                    # Files the index doesn't know about (filed before it
+                    # existed, or after it was deleted) keep their names
+                    if not (self.output_dir / physical).exists():
+                        break
+                    number += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO counters VALUES (?, ?, ?)", (folder, base_name, number)
+                )
+                conn.execute(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    (logical, folder, base_name, physical.as_posix(), content_hash, time.time())
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        path = self.output_dir / physical
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return logical, path
+
+    def release(self, folder, logical):
+        """Forget a reservation whose file never made it to disk"""
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM entries WHERE folder = ? AND logical = ?", (folder, logical)
+            )
+
+    def lookup(self, folder, logical):
+        """Physical path for a logical name, or None"""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT physical FROM entries WHERE folder = ? AND logical = ?", (folder, logical)
+            ).fetchone()
+        return self.output_dir / row[0] if row else None
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Metrics - stage timings, status counters and gauges for the pipeline
+A small in-process registry rendered in the Prometheus text format (the
+API serves it at /metrics). Recording is a perf_counter call and a dict
+update under a lock, so it stays on in the hot path
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds: a cached PDF takes milliseconds, a big OCR job takes minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {value}" for key, value in values]
+
+class Gauge(Metric):
+    """A value set directly, or read from a callback when rendered"""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), callback=None):
+        super().__init__(name, help_text, labels)
+        # callback() returns a number, or {label value: number} with one label
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        if self.callback is not None:
+            result = self.callback()
+            values = ({(key,): value for key, value in result.items()} if isinstance(result, dict)
+                      else {(): result})
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {value}"
+                                for key, value in sorted(values.items())]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (plus +Inf), sum, count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._values.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, [list(series[0]), series[1], series[2]]) for key, series in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labels + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {round(total, 6)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            # Registering the same name again returns the existing metric
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), callback=None):
+        gauge = self._register(Gauge(name, help_text, labels, callback))
+        if callback is not None:
+            gauge.callback = callback
+        return gauge
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# The process-wide registry. Batch worker processes have their own copy
+# and report through their result records instead (see record_document)
+METRICS = MetricsRegistry()
+
+STAGE_SECONDS = METRICS.histogram(
+    "beeps_stage_seconds", "Time spent in each pipeline stage per document", ("stage",))
+DOCUMENT_SECONDS = METRICS.histogram(
+    "beeps_document_seconds", "Time to process one document end to end")
+DOCUMENTS = METRICS.counter(
+    "beeps_documents_total", "Documents processed, by result status", ("status",))
+IN_FLIGHT = METRICS.gauge(
+    "beeps_documents_in_flight", "Documents being processed right now")
+EMAIL_SECONDS = METRICS.histogram(
+    "beeps_email_send_seconds", "Time to hand one email to the SMTP server")
+EMAILS = METRICS.counter(
+    "beeps_emails_total", "Emails sent directly over SMTP, by result", ("result",))
+
+_local = threading.local()
+
+@contextmanager
+def collect_stages():
+    """Collect stage() timings made on this thread into a dict"""
+    previous = getattr(_local, 'stages', None)
+    stages = _local.stages = {}
+    try:
+        yield stages
+    finally:
+        _local.stages = previous
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage for the document being processed on this thread
+
+    Stages don't overlap: time spent in a stage nested inside another (OCR
+    of a scanned page during 'extract') counts toward the inner one only.
+    """
+    nested = getattr(_local, 'nested', None)
+    if nested is None:
+        nested = _local.nested = []
+    # Time taken by stages nested in this one, to leave out of it
+    nested.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        inner = nested.pop()
+        if nested:
+            nested[-1] += elapsed
+        stages = getattr(_local, 'stages', None)
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed - inner
+
+def record_document(record):
+    """Count a finished document's status and observe its stage timings"""
+    DOCUMENTS.inc(status=record['status'])
+    if record.get('seconds') is not None:
+        DOCUMENT_SECONDS.observe(record['seconds'])
+    for name, seconds in (record.get('stages') or {}).items():
+        STAGE_SECONDS.observe(seconds, stage=name)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+OCR Engines - how DocumentProcessor turns images into text
+SubprocessOcrEngine: one pytesseract/tesseract process per image (original behaviour)
+PooledOcrEngine: long-lived warm OCR worker processes fed through a queue
+Both have submit(), which OCRs several images (PDF pages, TIFF frames) at once
+"""
+
+import os
+import re
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+from PIL import Image
+import pytesseract
+
+# Tesseract's own OpenMP threads compete with the pages already OCRed in
+# parallel here, so each tesseract gets one. Set before tesserocr loads;
+# tesseract subprocesses inherit it.
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+try:
+    # Optional: keeps Tesseract and its language data loaded in each worker
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# Tesseract API owned by each OCR worker process (set by _init_ocr_worker)
+_worker_api = None
+_worker_lang = None
+
+def _init_ocr_worker(lang):
+    """Load Tesseract once per OCR worker process"""
+    global _worker_api, _worker_lang
+    _worker_lang = lang
+    if tesserocr is not None:
+        _worker_api = tesserocr.PyTessBaseAPI(lang=lang)
+
+def _ocr_in_worker(mode, size, data, config):
+    """OCR raw image bytes inside an OCR worker process"""
+    image = Image.frombytes(mode, size, data)
+    psm = re.search(r'--psm\s+(\d+)', config)
+    dpi = re.search(r'--dpi\s+(\d+)', config)
+
+    if _worker_api is not None:
+        _worker_api.SetPageSegMode(int(psm.group(1)) if psm else tesserocr.PSM.AUTO)
+        _worker_api.SetImage(image)
+        if dpi:
+            _worker_api.SetSourceResolution(int(dpi.group(1)))
+        return _worker_api.GetUTF8Text()
+
+    # No tesserocr: stream the image through tesseract's stdin/stdout so
+    # nothing touches a temp file
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    command = [pytesseract.pytesseract.tesseract_cmd, 'stdin', 'stdout', '-l', _worker_lang]
+    command += config.split()
+    completed = subprocess.run(command, input=buffer.getvalue(), capture_output=True, check=True)
+    return completed.stdout.decode('utf-8')
+
+class SubprocessOcrEngine:
+    """pytesseract.image_to_string: a fresh tesseract process per image
+
+    submit() runs up to `workers` of those processes at once from a thread
+    pool; the threads only wait on tesseract, so the GIL isn't in the way.
+    """
+
+    def __init__(self, lang='eng', workers=None):
+        self.lang = lang
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pid'] = None
+        return state
+
+    def image_to_string(self, image, config=""):
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def submit(self, image, config=""):
+        """Start OCR of an image in the background and return a Future of its text"""
+        # A forked child inherits the pool without its threads, so it starts its own
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ocr")
+            self._pid = os.getpid()
+        return self._pool.submit(self.image_to_string, image, config)
+
+    def close(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown()
+        self._pool = None
+
+class PooledOcrEngine:
+    """OCR on a pool of long-lived worker processes
+
+    Images are sent to the workers as raw pixel bytes over the pool's
+    queue. Workers keep a tesserocr API (and the language data) loaded
+    between images when tesserocr is installed, and otherwise pipe PNG bytes
+    through the tesseract CLI without temp files.
+    """
+
+    def __init__(self, workers=2, lang='eng'):
+        self.workers = workers
+        self.lang = lang
+        self._pool = None
+        self._pid = None
+
+    def __getstate__(self):
+        # Each process that receives the engine starts its own workers
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pid'] = None
+        return state
+
+    @property
+    def pool(self):
+        # The same goes for a forked child: the parent's workers aren't its own
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_ocr_worker, initargs=(self.lang,)
+            )
+            self._pid = os.getpid()
+        return self._pool
+
+    def submit(self, image, config=""):
+        """Queue an image for OCR and return a Future of its text"""
+        if image.mode not in ('1', 'L', 'RGB'):
+            image = image.convert('RGB')
+        return self.pool.submit(_ocr_in_worker, image.mode, image.size, image.tobytes(), config)
+
+    def image_to_string(self, image, config=""):
+        return self.submit(image, config).result()
+
+    def close(self):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown()
+        self._pool = None
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+File Placement - puts processed documents into the library atomically
+Modes: move (rename), hardlink, reflink (copy-on-write clone) or copy
+"""
+
+import errno
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no ioctl, so reflink always falls back to copy
+    fcntl = None
+
+PLACEMENT_MODES = ('copy', 'move', 'hardlink', 'reflink')
+
+# ioctl(dest_fd, FICLONE, src_fd) clones file extents on Btrfs, XFS, etc.
+FICLONE = 0x40049409
+
+def reflink(src, dest):
+    """Clone src into a new file at dest sharing the same data blocks"""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(src, 'rb') as source, open(dest, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.unlink(dest)
+            raise
+    shutil.copystat(src, dest)
+
+def copy_durably(src, dest):
+    """Copy src to dest and flush the data to disk"""
+    shutil.copy2(src, dest)
+    with open(dest, 'rb+') as file:
+        os.fsync(file.fileno())
+
+def place_file(src, dest, mode='copy'):
+    """Put src at dest and return the mode actually used
+
+    The file is first materialised under a hidden temp name next to dest
+    and then renamed over dest, so dest is never seen half-written. Modes the
+    filesystem can't do (cross-device move/hardlink, no reflink support)
+    fall back to copy; a move that falls back removes src afterwards.
+    """
+    if mode not in PLACEMENT_MODES:
+        raise ValueError(f"Unknown placement mode: {mode}")
+
+    src = Path(src)
+    dest = Path(dest)
+    temp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex[:12]}.tmp")
+    used = 'copy'
+
+    try:
+        if mode == 'move':
+            try:
+                os.rename(src, temp)
+                used = 'move'
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        elif mode == 'hardlink':
+            try:
+                os.link(src, temp)
+                used = 'hardlink'
+            except OSError:
+                pass
+        elif mode == 'reflink':
+            try:
+                reflink(src, temp)
+                used = 'reflink'
+            except OSError:
+                pass
+
+        if used == 'copy':
+            copy_durably(src, temp)
+        os.replace(temp, dest)
+    except BaseException:
+        if used == 'move' and temp.exists():
+            os.rename(temp, src)
+        elif temp.exists():
+            temp.unlink()
+        raise
+
+    if mode == 'move' and used == 'copy':
+        os.unlink(src)
+    return used
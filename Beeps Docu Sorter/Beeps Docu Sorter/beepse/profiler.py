@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Profiler - where a slow batch spends its time and memory
+Each file is run under cProfile with tracemalloc tracing; the per-file
+profiles add up into a whole-run profile. The report lists the slowest
+files, the hottest functions and the time spent in PyPDF2, PIL, OCR and
+the classifier. Files are profiled one at a time per process, so keep
+profiling for diagnosis rather than production traffic.
+"""
+
+import cProfile
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+# Where a function's time is reported, matched against its source path
+PACKAGES = (
+    ('PyPDF2', ('/PyPDF2/', '/pypdf/')),
+    ('PIL', ('/PIL/',)),
+    ('ocr', ('/pytesseract/', '/tesserocr', 'ocr_engine.py', 'image_preprocessor.py')),
+    ('classifier', ('rules.py', 'client_roster.py')),
+    ('pipeline', ('document_processor.py', 'placement.py', 'library.py', 'result_cache.py')),
+)
+
+# The classifier's entry points live in document_processor.py
+CLASSIFIER_FUNCTIONS = {'classify_document', 'extract_client_info', 'is_resolved', 'is_unwanted_document'}
+
+def package_of(function):
+    """Package a pstats function key (filename, line, name) belongs to"""
+    filename, _, name = function
+    filename = filename.replace('\\', '/')
+    if name in CLASSIFIER_FUNCTIONS and filename.endswith('document_processor.py'):
+        return 'classifier'
+    for package, markers in PACKAGES:
+        if any(marker in filename for marker in markers):
+            return package
+    if filename == '~':
+        return 'builtins'
+    return 'other'
+
+def describe(function):
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f"{Path(filename).name}:{line}({name})"
+
+class FileProfile:
+    """One file's CPU profile and allocation figures. Picklable, so batch
+    workers can send it back with their result, and usable as a pstats
+    source (pstats calls create_stats() and reads .stats)"""
+
+    def __init__(self, file, seconds, stats, peak_bytes=0, net_bytes=0, allocations=()):
+        self.file = file
+        self.seconds = seconds
+        self.stats = stats
+        self.peak_bytes = peak_bytes
+        self.net_bytes = net_bytes
+        # [(source line, bytes, blocks)] that grew most while the file ran
+        self.allocations = list(allocations)
+
+    def create_stats(self):
+        pass
+
+    def hottest(self):
+        """The function with the most self time"""
+        if not self.stats:
+            return None
+        return describe(max(self.stats, key=lambda function: self.stats[function][2]))
+
+class RunProfiler:
+    def __init__(self, memory=True, top=15, allocation_sites=5):
+        # tracemalloc slows Python code down noticeably; memory=False skips it
+        self.memory = memory
+        self.top = top
+        self.allocation_sites = allocation_sites
+        self._lock = threading.Lock()
+        # Held while a file runs: only one profiler may be active at a time
+        self._active = threading.Lock()
+        self.reset()
+
+    def __getstate__(self):
+        # Batch workers start with an empty profiler and send results back
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        state['_active'] = None
+        state['files'] = []
+        state['_run'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.files = []
+            self._run = None
+
+    @contextmanager
+    def profile_file(self, file):
+        """Profile whatever runs inside the block as one file's work"""
+        with self._active:
+            if self.memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                tracemalloc.reset_peak()
+                current, _ = tracemalloc.get_traced_memory()
+                before = tracemalloc.take_snapshot()
+
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                result = FileProfile(Path(file).name, round(time.perf_counter() - start, 4), None)
+                if self.memory:
+                    # Before create_stats(), whose own allocations would show up
+                    after, peak = tracemalloc.get_traced_memory()
+                    result.peak_bytes = peak - current
+                    result.net_bytes = after - current
+                    result.allocations = self._growth(before, tracemalloc.take_snapshot())
+                    del before
+                profile.create_stats()
+                result.stats = profile.stats
+                self.add(result)
+
+    def _growth(self, before, after):
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, cProfile.__file__),
+                  tracemalloc.Filter(False, __file__)]
+        differences = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+        return [(f"{Path(difference.traceback[0].filename).name}:{difference.traceback[0].lineno}",
+                 difference.size_diff, difference.count_diff)
+                for difference in differences[:self.allocation_sites] if difference.size_diff > 0]
+
+    def add(self, result):
+        """Add one file's profile (from this process or a batch worker)"""
+        with self._lock:
+            self.files.append(result)
+            # pstats takes a source's stats dict over (and empties the source),
+            # so it gets a copy
+            source = FileProfile(result.file, result.seconds, dict(result.stats))
+            if self._run is None:
+                self._run = pstats.Stats(source)
+            else:
+                self._run.add(source)
+
+    def drain(self):
+        """Take the profiles collected so far, leaving the profiler empty
+        (a batch worker sends them back to the parent with each record)"""
+        with self._lock:
+            files, self.files, self._run = self.files, [], None
+        return files
+
+    def merge(self, profiles):
+        for result in profiles:
+            self.add(result)
+
+    def report(self, top=None):
+        """Slowest files, hottest functions and time per package"""
+        top = top or self.top
+        with self._lock:
+            files = list(self.files)
+            stats = dict(self._run.stats) if self._run is not None else {}
+
+        packages = {}
+        for function, (_, _, self_seconds, _, _) in stats.items():
+            package = package_of(function)
+            packages[package] = packages.get(package, 0.0) + self_seconds
+        hottest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        slowest = sorted(files, key=lambda result: result.seconds, reverse=True)[:top]
+        peak_bytes = max((result.peak_bytes for result in files), default=0)
+
+        allocations = {}
+        for result in files:
+            for site, size, count in result.allocations:
+                total = allocations.setdefault(site, [0, 0])
+                total[0] += size
+                total[1] += count
+
+        return {
+            'files': len(files),
+            'seconds': round(sum(result.seconds for result in files), 3),
+            'peak_file_mb': round(peak_bytes / 1024 / 1024, 2),
+            'packages': {package: round(seconds, 4)
+                         for package, seconds in sorted(packages.items(), key=lambda item: -item[1])},
+            'slowest_files': [{
+                'file': result.file,
+                'seconds': result.seconds,
+                'peak_mb': round(result.peak_bytes / 1024 / 1024, 2),
+                'retained_kb': round(result.net_bytes / 1024, 1),
+                'hottest': result.hottest(),
+            } for result in slowest],
+            'hottest_functions': [{
+                'function': describe(function),
+                'package': package_of(function),
+                'calls': calls,
+                'self_seconds': round(self_seconds, 4),
+                'cumulative_seconds': round(cumulative, 4),
+            } for function, (_, calls, self_seconds, cumulative, _) in hottest],
+            'allocations': [{'site': site, 'kb': round(size / 1024, 1), 'blocks': count}
+                            for site, (size, count) in sorted(allocations.items(), key=lambda item: -item[1][0])[:top]],
+        }
+
+    def format_report(self, top=None):
+        report = self.report(top)
+        lines = [f"🔬 Profiled {report['files']} files, {report['seconds']}s in total "
+                 f"(largest per-file peak {report['peak_file_mb']} MB)"]
+        lines.append("\n⏱️ Time by package (self time):")
+        for package, seconds in report['packages'].items():
+            lines.append(f"  {package:<12} {seconds:>9.3f}s")
+        lines.append("\n🐢 Slowest files:")
+        for entry in report['slowest_files']:
+            lines.append(f"  {entry['seconds']:>8.3f}s  {entry['peak_mb']:>7.2f} MB peak  "
+                         f"{entry['file']}  [{entry['hottest']}]")
+        lines.append("\n🔥 Hottest functions:")
+        for entry in report['hottest_functions']:
+            lines.append(f"  {entry['self_seconds']:>8.3f}s self  {entry['cumulative_seconds']:>8.3f}s cum  "
+                         f"{entry['calls']:>8} calls  {entry['package']:<10} {entry['function']}")
+        if report['allocations']:
+            lines.append("\n🧠 Largest allocation growth:")
+            for entry in report['allocations']:
+                lines.append(f"  {entry['kb']:>10.1f} KB  {entry['blocks']:>7} blocks  {entry['site']}")
+        return "\n".join(lines)
+
+    def dump(self, directory):
+        """Write run.prof (for pstats, snakeviz...) and report.json"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if self._run is not None:
+                self._run.dump_stats(directory / "run.prof")
+        (directory / "report.json").write_text(json.dumps(self.report(), indent=1))
+        return directory
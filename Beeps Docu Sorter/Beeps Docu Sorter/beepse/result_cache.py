@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Result Cache - remembers extraction results by file content
+Re-uploaded documents cost one hash and a lookup instead of a PyPDF2/OCR pass
+"""
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+def hash_file(file_path):
+    """SHA-256 of a file's content, read through a memory map"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            digest.update(mapped)
+    return digest.hexdigest()
+
+class ResultCache:
+    """SQLite cache of extracted text, document type and client name keyed by
+    content hash + ruleset version, evicting least recently used entries once
+    the stored text goes over max_bytes"""
+
+    def __init__(self, path, ruleset_version, max_bytes=256 * 1024 * 1024):
+        self.path = Path(path)
+        self.ruleset_version = ruleset_version
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    def __getstate__(self):
+        # Connections can't cross process boundaries; each worker reconnects
+        state = self.__dict__.copy()
+        state['_lock'] = None
+        state['_conn'] = None
+        state['_pid'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Open the database on first use (once per process)"""
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    content_hash TEXT NOT NULL,
+                    ruleset TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    doc_type TEXT NOT NULL,
+                    client_name TEXT,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (content_hash, ruleset)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, content_hash):
+        """Return (text, doc_type, client_name) for a hash, or None"""
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    "SELECT text, doc_type, client_name FROM results WHERE content_hash = ? AND ruleset = ?",
+                    (content_hash, self.ruleset_version)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE results SET last_used = ? WHERE content_hash = ? AND ruleset = ?",
+                        (time.time(), content_hash, self.ruleset_version)
+                    )
+                    conn.commit()
+                return row
+        except sqlite3.Error as e:
+            print(f"Result cache lookup failed: {e}")
+            return None
+
+    def put(self, content_hash, text, doc_type, client_name):
+        """Store an extraction result and evict old entries if over budget"""
+        size = len(text.encode('utf-8')) + len(doc_type) + len(client_name or "")
+        if size > self.max_bytes:
+            return
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (content_hash, self.ruleset_version, text, doc_type, client_name, size, time.time())
+                )
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"Result cache store failed: {e}")
+
+    def _evict(self, conn):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        while total > self.max_bytes:
+            oldest = conn.execute(
+                "SELECT rowid, size FROM results ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not oldest:
+                break
+            for rowid, size in oldest:
+                conn.execute("DELETE FROM results WHERE rowid = ?", (rowid,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def clear(self):
+        """Remove every cached result"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM results")
+            conn.commit()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Document Rules - declarative document types, unwanted patterns and folders
+Compiled once into a single regex so each document is scanned in one pass
+"""
+
+import hashlib
+import json
+import re
+from collections import namedtuple
+
+# Document types, checked in order. A type matches when ALL of its "all"
+# patterns are present, or ANY of its "any" patterns is. Processed files
+# go to output_dir/<folder>.
+DOCUMENT_TYPES = [
+    {"type": "RDL", "folder": "RDL",
+     "all": ["DEPARTMENT OF VETERANS AFFAIRS", "RATING DECISION"]},
+    {"type": "RCS", "folder": "RCS",
+     "any": ["TM CLIENT AUTHORIZATION", "TM-RCS-"]},
+]
+
+# Documents we never file (driver's license, passport, ...). "word": True
+# only matches the pattern as a whole word, so "DL" no longer fires inside
+# "HANDLE" or "MIDDLE".
+UNWANTED_PATTERNS = [
+    {"pattern": "DRIVER'S LICENSE"},
+    {"pattern": "DRIVERS LICENSE"},
+    {"pattern": "DL", "word": True},
+    {"pattern": "PASSPORT"},
+    {"pattern": "BIRTH CERTIFICATE"},
+    {"pattern": "SOCIAL SECURITY CARD"},
+]
+
+UNKNOWN_FOLDER = "UNKNOWN"
+REVIEW_FOLDER = "REVIEW_NEEDED"
+
+ScanResult = namedtuple("ScanResult", ["doc_type", "unwanted", "matched"])
+
+class RuleEngine:
+    """Single-pass matcher for the document type and unwanted-pattern tables"""
+
+    def __init__(self, document_types=None, unwanted_patterns=None):
+        self.document_types = document_types if document_types is not None else DOCUMENT_TYPES
+        self.unwanted_patterns = unwanted_patterns if unwanted_patterns is not None else UNWANTED_PATTERNS
+        self.version = self._fingerprint()
+        self._compile()
+
+    def _fingerprint(self):
+        """Short hash of the rule tables, so result caches notice rule edits"""
+        tables = json.dumps([self.document_types, self.unwanted_patterns], sort_keys=True)
+        return hashlib.sha256(tables.encode('utf-8')).hexdigest()[:12]
+
+    def _compile(self):
+        """Build one alternation over every distinct pattern in the tables"""
+        specs = {}
+        for rule in self.document_types:
+            for pattern in rule.get("all", []) + rule.get("any", []):
+                specs.setdefault((pattern.upper(), False), None)
+        for rule in self.unwanted_patterns:
+            specs.setdefault((rule["pattern"].upper(), bool(rule.get("word"))), None)
+        self._specs = list(specs)
+
+        # Longest first so the alternation prefers the most specific match;
+        # shorter patterns found inside a longer match are credited too. The
+        # alternation sits in a lookahead, so a match consumes nothing and
+        # the scan tries again one character later: patterns that partly
+        # overlap ("DRIVERS LICENSE", "LICENSE PLATE") are all found.
+        order = sorted(range(len(self._specs)), key=lambda index: -len(self._specs[index][0]))
+        alternatives = []
+        for index in order:
+            pattern, word = self._specs[index]
+            regex = re.escape(pattern)
+            if word:
+                regex = rf"(?<![A-Z0-9]){regex}(?![A-Z0-9])"
+            alternatives.append(f"(?P<p{index}>{regex})")
+        self._regex = re.compile("(?=" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+        self._implied = {}
+        for index, (pattern, _) in enumerate(self._specs):
+            self._implied[index] = {
+                other for other, (other_pattern, other_word) in enumerate(self._specs)
+                if other != index and not other_word and other_pattern in pattern
+            }
+
+        self._index = {spec: index for index, spec in enumerate(self._specs)}
+
+    def scan(self, text):
+        """Scan the text once and return every verdict as a ScanResult"""
+        hits = set()
+        for match in self._regex.finditer(text):
+            index = int(match.lastgroup[1:])
+            hits.add(index)
+            hits.update(self._implied[index])
+        matched = {self._specs[index][0] for index in hits}
+
+        doc_type = UNKNOWN_FOLDER
+        for rule in self.document_types:
+            required = rule.get("all", [])
+            alternatives = rule.get("any", [])
+            if ((required and all(self._index[(pattern.upper(), False)] in hits for pattern in required)) or
+                    any(self._index[(pattern.upper(), False)] in hits for pattern in alternatives)):
+                doc_type = rule["type"]
+                break
+
+        unwanted = any(
+            self._index[(rule["pattern"].upper(), bool(rule.get("word")))] in hits
+            for rule in self.unwanted_patterns
+        )
+        return ScanResult(doc_type, unwanted, matched)
+
+    def folder_for(self, doc_type):
+        """Output folder for a document type"""
+        for rule in self.document_types:
+            if rule["type"] == doc_type:
+                return rule.get("folder", doc_type)
+        return UNKNOWN_FOLDER
+
+    def output_folders(self):
+        """Every folder the processed library needs"""
+        folders = [rule.get("folder", rule["type"]) for rule in self.document_types]
+        return folders + [UNKNOWN_FOLDER, REVIEW_FOLDER]
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+SMTP Connection Pool - reuses logged-in SMTP sessions across emails
+Opening a connection costs a TCP handshake, STARTTLS and a login; a pooled
+session sends the next email straight away. Idle sessions are checked with
+NOOP before reuse and replaced when the server has dropped them
+"""
+
+import smtplib
+import threading
+import time
+
+class SmtpConnectionPool:
+    def __init__(self, host, port, user, password, starttls=True, size=2, idle_check_after=10.0,
+                 max_idle=240.0, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.size = max(1, size)
+        # Sessions idle longer than this get a NOOP before they're reused...
+        self.idle_check_after = idle_check_after
+        # ...and longer than this are closed (servers drop idle clients anyway)
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._idle = []  # (connection, last used), most recent last
+        self._open = 0
+        self._closed = False
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()  # Enable encryption
+            server.login(self.user, self.password)
+        except Exception:
+            self._discard(server)
+            raise
+        return server
+
+    @staticmethod
+    def _discard(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _alive(server):
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def acquire(self, timeout=None):
+        """A logged-in connection, waiting while all `size` are busy"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("SMTP connection pool is closed")
+                if self._idle:
+                    server, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    # Count it now so other threads don't overshoot the size
+                    self._open += 1
+                    server = None
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No SMTP connection free")
+                self._condition.wait(remaining)
+
+        # Network I/O happens outside the lock
+        try:
+            if server is not None:
+                idle = time.monotonic() - last_used
+                if idle > self.max_idle or (idle > self.idle_check_after and not self._alive(server)):
+                    self._discard(server)
+                    server = None
+            return server or self._connect()
+        except Exception:
+            self._forget()
+            raise
+
+    def release(self, server, broken=False):
+        """Return a connection; broken ones are closed instead of reused"""
+        if broken or self._closed:
+            self._discard(server)
+            self._forget()
+            return
+        with self._condition:
+            self._idle.append((server, time.monotonic()))
+            self._condition.notify()
+
+    def _forget(self):
+        with self._condition:
+            self._open -= 1
+            self._condition.notify()
+
+    def close(self):
+        """Close idle connections; busy ones close when released"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._condition.notify_all()
+        for server, _ in idle:
+            self._discard(server)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Local SMTP Sink - an offline stand-in for Gmail
+Accepts any login and keeps the messages it receives, optionally saving
+them to a directory. It can be told to fail or stall a share of sends or
+to refuse addresses, so the outbox's retries, permanent failures and
+throughput can be tested without a network
+
+Run: python3 smtp_sink.py [--port 1025] [--fail-rate 0.2] [--delay 0.1]
+Then point the service at it:
+     SMTP_SERVER=127.0.0.1 SMTP_PORT=1025 SMTP_STARTTLS=0 python3 api_server.py
+"""
+
+import argparse
+import random
+import socketserver
+import threading
+import time
+from pathlib import Path
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    """One SMTP session (just enough of RFC 5321 for smtplib)"""
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        sink = self.server
+        sink.count('connections')
+        self.reply("220 smtp-sink ready")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+
+            if verb in ("EHLO", "HELO"):
+                self.reply("250-smtp-sink")
+                self.reply("250-AUTH PLAIN LOGIN")
+                self.reply("250 8BITMIME")
+            elif verb == "AUTH":
+                if command.upper().startswith("AUTH LOGIN"):
+                    # Username and password prompts; any answer will do
+                    for _ in range(2 - len(command.split()[2:])):
+                        self.reply("334 ")
+                        self.rfile.readline()
+                self.reply("235 Authenticated")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command[8:].strip()
+                if recipient.strip("<>").lower() in sink.reject:
+                    self.reply("550 No such user (simulated)")
+                    continue
+                recipients.append(recipient)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line or line == b".\r\n":
+                        break
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                self.reply(sink.deliver(sender, recipients, b"".join(lines)))
+                sender, recipients = None, []
+            elif verb == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "NOOP":
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=1025, fail_rate=0.0, delay=0.0, save_dir=None, seed=None,
+                 reject=()):
+        super().__init__((host, port), SinkHandler)
+        # Share of messages answered with a temporary failure (451)
+        self.fail_rate = fail_rate
+        # Addresses refused for good (550), like a mailbox that doesn't exist
+        self.reject = {address.lower() for address in reject}
+        # Seconds each message takes to "deliver"
+        self.delay = delay
+        self.save_dir = Path(save_dir) if save_dir else None
+        if self.save_dir:
+            self.save_dir.mkdir(parents=True, exist_ok=True)
+        self.messages = []
+        self.stats = {'connections': 0, 'accepted': 0, 'failed': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def deliver(self, sender, recipients, data):
+        """Keep one message; returns the SMTP reply"""
+        if self.delay:
+            time.sleep(self.delay)
+        with self._lock:
+            if self._random.random() < self.fail_rate:
+                self.stats['failed'] += 1
+                return "451 Temporary failure (simulated)"
+            self.stats['accepted'] += 1
+            self.messages.append((sender, recipients, data))
+            number = len(self.messages)
+        if self.save_dir:
+            (self.save_dir / f"{number:06d}.eml").write_bytes(data)
+        return "250 OK"
+
+    def start(self):
+        """Serve on a background thread; returns self"""
+        self._thread = threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink for offline email testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of messages to fail with 451")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to spend on each message")
+    parser.add_argument("--save-dir", default=None, help="write received messages here as .eml files")
+    args = parser.parse_args()
+
+    sink = SmtpSink(args.host, args.port, args.fail_rate, args.delay, args.save_dir)
+    print(f"📮 SMTP sink listening on {args.host}:{sink.port}")
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {sink.stats}")
+
+if __name__ == "__main__":
+    main()
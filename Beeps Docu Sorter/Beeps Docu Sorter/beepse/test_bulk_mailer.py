@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Bulk mailer tests - templated broadcasts against the local SMTP sink
+Run: python3 -m pytest
+"""
+
+from bulk_mailer import BulkMailer
+
+def test_every_recipient_gets_a_status(email_service, sink):
+    results = BulkMailer(email_service).send(
+        "Hello ${name}", "Dear ${name}", ["a@example.com", "bad", "A@example.com"], {'name': "client"})
+
+    assert [result['status'] for result in results] == ['sent', 'invalid', 'skipped']
+    assert len(sink.messages) == 1
+
+def test_sends_over_the_rate_limit_are_deferred(email_service, sink, tmp_path):
+    outbox = email_service.use_outbox(tmp_path / "outbox.sqlite3", rate_per_hour=1, burst=2, digest_window=0)
+    recipients = [f"client{number}@example.com" for number in range(5)]
+
+    results = BulkMailer(email_service).send("Notice", "Hello", recipients)
+
+    statuses = [result['status'] for result in results]
+    assert statuses.count('sent') == 2 and statuses.count('deferred') == 3
+    assert len(sink.messages) == 2
+    assert outbox.counts()['pending'] == 3
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Client roster tests - fuzzy name matching
+Run: python3 -m pytest
+"""
+
+from client_roster import ClientRoster
+
+def make_roster(*clients):
+    roster = ClientRoster()
+    roster.load(clients)
+    return roster
+
+def test_close_spelling_matches():
+    roster = make_roster(("C-1", "John Smith"), ("C-2", "Mary Jones"))
+
+    client_id, score = roster.match("JON SMITH")
+
+    assert client_id == "C-1"
+    assert 0.6 <= score < 1.0
+
+def test_shared_name_is_ambiguous():
+    roster = make_roster(("C-1", "John Smith"), ("C-2", "SMITH, JOHN"))
+
+    assert roster.match("John Smith") == (None, 1.0)
+
+def test_near_tie_is_ambiguous():
+    roster = make_roster(("C-1", "John Smith"), ("C-2", "Joan Smith"))
+
+    client_id, _ = roster.match("JOHAN SMITH")
+
+    assert client_id is None
+
+def test_initial_and_surname_is_not_a_match():
+    roster = make_roster(("C-1", "Jon Smith"))
+
+    client_id, _ = roster.match("J SMITH")
+
+    assert client_id is None
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Email outbox tests - retries, backoff and permanent failures against smtp_sink
+Run: python3 -m pytest
+"""
+
+import time
+
+def make_outbox(email_service, tmp_path, **options):
+    options.setdefault('digest_window', 0)
+    options.setdefault('rate_per_hour', None)
+    options.setdefault('base_delay', 0.05)
+    return email_service.use_outbox(tmp_path / "outbox.sqlite3", **options)
+
+def row(outbox, email_id):
+    with outbox._lock:
+        return outbox._connection().execute(
+            "SELECT state, attempts, last_error, next_attempt FROM outbox WHERE id = ?", (email_id,)
+        ).fetchone()
+
+def test_temporary_failure_is_retried(email_service, sink, tmp_path):
+    outbox = make_outbox(email_service, tmp_path)
+    sink.fail_rate = 1.0
+    email_id = outbox.enqueue("client@example.com", "Processed", "Your document is filed")
+
+    assert outbox.send_due() == 0
+    state, attempts, last_error, next_attempt = row(outbox, email_id)
+    assert (state, attempts) == ('pending', 1)
+    assert "451" in last_error and next_attempt > time.time()
+
+    sink.fail_rate = 0.0
+    assert outbox.flush(timeout=5) == 0
+    assert row(outbox, email_id)[:2] == ('sent', 2)
+    assert len(sink.messages) == 1
+
+def test_backoff_doubles_up_to_the_cap(email_service, tmp_path):
+    outbox = make_outbox(email_service, tmp_path, base_delay=30, max_delay=200)
+
+    delays = [outbox.backoff(attempts) for attempts in range(1, 6)]
+
+    for delay, expected in zip(delays, [30, 60, 120, 200, 200]):
+        assert expected * 0.9 <= delay <= expected * 1.1
+
+def test_gives_up_after_max_attempts(email_service, sink, tmp_path):
+    outbox = make_outbox(email_service, tmp_path, base_delay=0.01, max_attempts=3)
+    sink.fail_rate = 1.0
+    email_id = outbox.enqueue("client@example.com", "Processed", "Your document is filed")
+
+    outbox.flush(timeout=5)
+
+    assert row(outbox, email_id)[:2] == ('failed', 3)
+    assert sink.stats['failed'] == 3
+
+def test_permanent_failure_is_not_retried(email_service, sink, tmp_path):
+    outbox = make_outbox(email_service, tmp_path)
+    sink.reject = {"gone@example.com"}
+    gone = outbox.enqueue("gone@example.com", "Processed", "Your document is filed")
+    kept = outbox.enqueue("client@example.com", "Processed", "Your document is filed")
+
+    outbox.send_due()
+
+    assert row(outbox, gone)[:2] == ('failed', 1)
+    assert row(outbox, kept)[0] == 'sent'
+    assert outbox.counts()['pending'] == 0
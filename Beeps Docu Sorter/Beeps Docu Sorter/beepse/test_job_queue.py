@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Job queue tests - background jobs next to batch worker pools
+Run: python3 -m pytest
+"""
+
+import random
+import threading
+import time
+import corpus
+from document_processor import DocumentProcessor
+from job_queue import JobQueue
+
+def wait_for(job_queue, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = job_queue.status(job_id)
+        if status['state'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {status['state']}")
+
+class CountingProcessor:
+    """Stands in for DocumentProcessor, counting the files it is given"""
+
+    def __init__(self):
+        self.files = []
+
+    def process_file_detailed(self, path, **client):
+        self.files.append(path)
+        time.sleep(0.1)
+        return {'file': "letter.pdf", 'status': "PROCESSED_RDL", 'output_path': None, 'seconds': 0.1}
+
+def test_job_claimed_by_two_processes_runs_once(tmp_path):
+    processor = CountingProcessor()
+    queues = [JobQueue(processor, store_dir=tmp_path) for _ in range(2)]
+    job_id = queues[0].new_job()
+    with queues[0]._lock:
+        # Queued but not yet picked up, as both processes find it on recover()
+        queues[0]._conn.execute(
+            "INSERT INTO jobs (id, state, filename, path, created) VALUES (?, 'queued', 'letter.pdf', ?, ?)",
+            (job_id, str(queues[0].job_dir(job_id) / "letter.pdf"), time.time())
+        )
+        queues[0]._conn.commit()
+
+    start = threading.Barrier(2)
+    def run(job_queue):
+        start.wait()
+        job_queue._run(job_id)
+    threads = [threading.Thread(target=run, args=(job_queue,)) for job_queue in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(processor.files) == 1
+    assert queues[1].status(job_id)['state'] == 'done'
+    for job_queue in queues:
+        job_queue.shutdown()
+
+def test_batch_after_a_single_file_job(tmp_path):
+    rng = random.Random(5)
+    processor = DocumentProcessor(tmp_path / "uploads", tmp_path / "processed", cache=False, outbox=False)
+    job_queue = JobQueue(processor, store_dir=tmp_path / "job_store")
+    try:
+        # A scan warms the OCR pool and every lock on the job worker threads
+        job_id = job_queue.new_job()
+        scan = job_queue.job_dir(job_id) / "scan.pdf"
+        corpus.render_scan(rng, corpus.rdl_text(rng, "JOHN SMITH")).save(scan, resolution=150)
+        job_queue.submit(job_id, scan)
+        wait_for(job_queue, job_id)
+
+        files = [corpus.write_text_pdf(tmp_path / f"letter_{number}.pdf", [corpus.rdl_text(rng, "JANE DOE")])
+                 for number in range(3)]
+        records = []
+        batch = threading.Thread(target=lambda: records.extend(processor.iter_process(files, workers=2)),
+                                 daemon=True)
+        batch.start()
+        batch.join(timeout=60)
+
+        assert not batch.is_alive(), "the batch hung on state inherited from the job threads"
+        assert [record['status'] for record in records] == ["PROCESSED_RDL"] * 3
+    finally:
+        job_queue.shutdown()
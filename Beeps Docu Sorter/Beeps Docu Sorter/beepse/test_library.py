@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Library tests - name reservation and suffixes
+Run: python3 -m pytest
+"""
+
+import random
+import corpus
+from document_processor import DocumentProcessor
+from library import Library
+
+def test_repeat_names_get_suffixes(tmp_path):
+    library = Library(tmp_path)
+
+    names = [library.reserve("RDL", "SMITH_RDL.pdf", f"hash-{number}")[0] for number in range(3)]
+
+    assert names == ["SMITH_RDL.pdf", "SMITH_RDL_2.pdf", "SMITH_RDL_3.pdf"]
+
+def test_same_content_gets_its_entry_back(tmp_path):
+    library = Library(tmp_path)
+
+    first = library.reserve("RDL", "SMITH_RDL.pdf", "same")
+    assert library.reserve("RDL", "SMITH_RDL.pdf", "same") == first
+
+def test_files_already_on_disk_are_not_overwritten(tmp_path):
+    (tmp_path / "RDL").mkdir()
+    (tmp_path / "RDL" / "SMITH_RDL.pdf").write_bytes(b"filed before the index existed")
+    (tmp_path / "RDL" / "SMITH_RDL_2.pdf").write_bytes(b"and another")
+
+    logical, path = Library(tmp_path).reserve("RDL", "SMITH_RDL.pdf", "new")
+
+    assert logical == "SMITH_RDL_3.pdf"
+    assert not path.exists()
+
+def test_suffixes_follow_input_order_with_workers(tmp_path):
+    rng = random.Random(3)
+    files = []
+    for number in range(6):
+        # Later files are shorter, so workers tend to finish them first
+        pages = [corpus.rdl_text(rng, "JOHN SMITH")] + [corpus.filler_page(rng)] * (6 - number)
+        files.append(corpus.write_text_pdf(tmp_path / f"letter_{number}.pdf", pages))
+    processor = DocumentProcessor(tmp_path / "uploads", tmp_path / "processed", cache=False, outbox=False)
+
+    records = list(processor.iter_process(files, workers=3))
+
+    assert [record['file'] for record in records] == [path.name for path in files]
+    assert [record['output_path'].rsplit('/', 1)[1] for record in records] == [
+        "JOHN_SMITH_RDL.pdf"] + [f"JOHN_SMITH_RDL_{number}.pdf" for number in range(2, 7)]
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+"""
+Metrics tests - stage timings
+Run: python3 -m pytest
+"""
+
+import time
+from metrics import collect_stages, stage
+
+def test_nested_stage_is_not_counted_twice():
+    with collect_stages() as stages:
+        with stage('extract'):
+            time.sleep(0.02)
+            with stage('ocr'):
+                time.sleep(0.1)
+
+    assert stages['ocr'] >= 0.1
+    assert 0.02 <= stages['extract'] < 0.08
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Pipeline tests - whole documents through DocumentProcessor
+Run: python3 -m pytest
+"""
+
+import pickle
+import random
+import threading
+import corpus
+import document_processor
+from PIL import Image
+from client_roster import ClientRoster
+from ocr_engine import SubprocessOcrEngine
+from profiler import RunProfiler
+from document_processor import DocumentProcessor
+
+def make_processor(tmp_path, **options):
+    options.setdefault('cache', False)
+    options.setdefault('outbox', False)
+    return DocumentProcessor(tmp_path / "uploads", tmp_path / "processed", **options)
+
+def write_packet(path, *pages):
+    rng = random.Random(1)
+    return corpus.write_text_pdf(path, [corpus.rdl_text(rng, "JOHN SMITH"), *pages])
+
+def test_id_document_later_in_packet_is_unwanted(tmp_path):
+    processor = make_processor(tmp_path)
+    packet = write_packet(tmp_path / "packet.pdf", "PASSPORT\nUnited States of America")
+
+    record = processor.process_file_detailed(packet)
+
+    assert record['status'] == "UNWANTED"
+    assert not list((tmp_path / "processed" / "RDL").iterdir())
+
+def test_early_exit_is_opt_in(tmp_path):
+    packet = write_packet(tmp_path / "packet.pdf", "PASSPORT")
+
+    assert make_processor(tmp_path).stream_pages is False
+    # The documented trade-off: early exit never reads page 2
+    assert make_processor(tmp_path, stream_pages=True).process_file(packet) == "PROCESSED_RDL"
+
+def test_letter_is_filed_under_client_name(tmp_path):
+    letter = write_packet(tmp_path / "letter.pdf", corpus.filler_page(random.Random(2)))
+
+    record = make_processor(tmp_path).process_file_detailed(letter)
+
+    assert record['status'] == "PROCESSED_RDL"
+    assert record['output_path'].endswith("JOHN_SMITH_RDL.pdf")
+
+def test_roster_match_reaches_the_record(tmp_path):
+    roster = ClientRoster()
+    roster.add("C-17", "Smith, John")
+    letter = write_packet(tmp_path / "letter.pdf", corpus.filler_page(random.Random(2)))
+
+    record = make_processor(tmp_path, roster=roster).process_file_detailed(letter)
+
+    assert record['client_id'] == "C-17"
+    assert record['match_confidence'] == 1.0
+
+def test_roster_survives_pickling():
+    roster = ClientRoster()
+    roster.add("C-17", "John Smith")
+
+    copy = pickle.loads(pickle.dumps(roster))
+
+    assert copy.match("JOHN SMITH") == ("C-17", 1.0)
+    copy.add("C-18", "Jane Doe")
+
+def test_batch_workers_start_their_own_ocr_pool(tmp_path):
+    rng = random.Random(4)
+    scans = []
+    for number in range(3):
+        path = tmp_path / f"scan_{number}.pdf"
+        corpus.render_scan(rng, corpus.rdl_text(rng, "JOHN SMITH")).save(path, resolution=150)
+        scans.append(path)
+    processor = make_processor(tmp_path)
+    # Start the OCR thread pool here, so forked workers inherit it
+    processor.ocr_engine.submit(Image.new('L', (8, 8))).exception()
+
+    records = []
+    batch = threading.Thread(target=lambda: records.extend(processor.iter_process(scans, workers=2)),
+                             daemon=True)
+    batch.start()
+    batch.join(timeout=60)
+
+    assert not batch.is_alive(), "a batch worker is stuck on the parent's OCR pool"
+    assert len(records) == len(scans)
+
+def test_batch_workers_split_the_ocr_concurrency(tmp_path):
+    processor = make_processor(tmp_path, ocr_engine=SubprocessOcrEngine(workers=8))
+
+    document_processor._init_worker(processor, batch_workers=4)
+
+    assert document_processor._worker_processor.ocr_engine.workers == 2
+
+def test_batch_profiles_each_file_once(tmp_path):
+    rng = random.Random(6)
+    files = [corpus.write_text_pdf(tmp_path / f"a{number}.pdf", [corpus.rdl_text(rng, "JOHN SMITH")])
+             for number in range(4)]
+    processor = make_processor(tmp_path, profiler=RunProfiler(memory=False))
+
+    processor.process_file(files[0])
+    list(processor.iter_process(files[1:], workers=3))
+
+    assert sorted(result.file for result in processor.profiler.files) == [path.name for path in files]
+
+def test_content_hash_without_a_cache(tmp_path):
+    letter = write_packet(tmp_path / "letter.pdf", corpus.filler_page(random.Random(2)))
+
+    record = make_processor(tmp_path).process_file_detailed(letter, content_hash="0" * 64)
+
+    assert record['status'] == "PROCESSED_RDL"
+
+def test_no_cache_stage_without_a_cache(tmp_path):
+    letter = write_packet(tmp_path / "letter.pdf", corpus.filler_page(random.Random(2)))
+
+    record = make_processor(tmp_path).process_file_detailed(letter)
+
+    assert 'cache' not in record['stages'] and 'extract' in record['stages']
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Placement tests - atomic placement and rollback in every mode
+Run: python3 -m pytest
+"""
+
+import pytest
+from placement import PLACEMENT_MODES, place_file
+
+def make_source(tmp_path):
+    src = tmp_path / "upload.pdf"
+    src.write_bytes(b"%PDF-1.4 letter")
+    (tmp_path / "library").mkdir()
+    return src
+
+@pytest.mark.parametrize("mode", PLACEMENT_MODES)
+def test_file_is_placed(tmp_path, mode):
+    src = make_source(tmp_path)
+    dest = tmp_path / "library" / "SMITH_RDL.pdf"
+
+    used = place_file(src, dest, mode)
+
+    assert used in PLACEMENT_MODES
+    assert dest.read_bytes() == b"%PDF-1.4 letter"
+    assert src.exists() == (mode != 'move')
+    assert [path.name for path in dest.parent.iterdir()] == ["SMITH_RDL.pdf"]
+
+@pytest.mark.parametrize("mode", PLACEMENT_MODES)
+def test_failed_placement_rolls_back(tmp_path, mode):
+    src = make_source(tmp_path)
+    # A directory in the way makes the final rename fail
+    dest = tmp_path / "library" / "SMITH_RDL.pdf"
+    dest.mkdir()
+    (dest / "keep").write_bytes(b"")
+
+    with pytest.raises(OSError):
+        place_file(src, dest, mode)
+
+    assert src.read_bytes() == b"%PDF-1.4 letter"
+    assert [path.name for path in (tmp_path / "library").iterdir()] == ["SMITH_RDL.pdf"]
+    assert [path.name for path in dest.iterdir()] == ["keep"]
+
+def test_unknown_mode_is_refused(tmp_path):
+    with pytest.raises(ValueError):
+        place_file(make_source(tmp_path), tmp_path / "library" / "x.pdf", "symlink")
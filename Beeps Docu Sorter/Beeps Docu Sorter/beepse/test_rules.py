@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Rule engine tests - document types and unwanted patterns in one scan
+Run: python3 -m pytest
+"""
+
+import pytest
+from rules import RuleEngine
+
+@pytest.mark.parametrize("text", ["Please HANDLE with care", "MIDDLE NAME", "Models: XDL-200"])
+def test_dl_inside_a_word_is_not_unwanted(text):
+    assert not RuleEngine().scan(text).unwanted
+
+@pytest.mark.parametrize("text", ["DL 123-456-789", "Copy of DL.", "ID (dl) attached"])
+def test_dl_on_its_own_is_unwanted(text):
+    assert RuleEngine().scan(text).unwanted
+
+def test_types_need_every_all_pattern():
+    rules = RuleEngine()
+
+    assert rules.scan("DEPARTMENT OF VETERANS AFFAIRS\nRATING DECISION").doc_type == "RDL"
+    assert rules.scan("DEPARTMENT OF VETERANS AFFAIRS").doc_type == "UNKNOWN"
+    assert rules.scan("ref TM-RCS-0042").doc_type == "RCS"
+
+def test_partly_overlapping_patterns_both_match():
+    rules = RuleEngine(document_types=[{"type": "PLATE", "any": ["LICENSE PLATE"]}],
+                       unwanted_patterns=[{"pattern": "DRIVERS LICENSE"}])
+
+    verdict = rules.scan("Copy of DRIVERS LICENSE PLATE registration")
+
+    assert verdict.doc_type == "PLATE"
+    assert verdict.unwanted
+
+def test_pattern_inside_a_longer_match_is_credited():
+    rules = RuleEngine(document_types=[{"type": "ID", "any": ["LICENSE"]}],
+                       unwanted_patterns=[{"pattern": "DRIVER'S LICENSE"}])
+
+    verdict = rules.scan("DRIVER'S LICENSE")
+
+    assert verdict.doc_type == "ID" and verdict.unwanted
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Upload spool tests - streaming uploads through SpoolingRequest
+Run: python3 -m pytest
+"""
+
+import io
+import zipfile
+import pytest
+from flask import Flask, jsonify, request
+from upload_spool import SpoolingRequest, UploadRejected, UploadSpool, sniff_type
+
+PDF = b"%PDF-1.4\n" + b"0" * 2048
+
+def make_app(tmp_path, **limits):
+    app = Flask(__name__)
+    app.request_class = SpoolingRequest
+    spool = UploadSpool(tmp_path / "spool", **limits)
+    app.config['UPLOAD_SPOOL'] = spool
+
+    @app.route('/upload', methods=['POST'])
+    def upload():
+        path, size, _ = spool.store(request.files['document'].stream, tmp_path, "upload")
+        return jsonify({'path': str(path), 'size': size})
+
+    @app.errorhandler(UploadRejected)
+    def rejected(error):
+        return jsonify({'error': str(error)}), error.status_code
+
+    return app, spool
+
+def leftovers(spool):
+    return list(spool.incoming_dir.iterdir())
+
+def test_unstored_parts_are_discarded(tmp_path):
+    app, spool = make_app(tmp_path)
+
+    response = app.test_client().post('/upload', content_type='multipart/form-data', data={
+        'document': (io.BytesIO(PDF), "letter.pdf"),
+        'extra': (io.BytesIO(PDF), "extra.pdf"),
+    })
+
+    assert response.status_code == 200
+    assert (tmp_path / "upload.pdf").read_bytes() == PDF
+    assert leftovers(spool) == []
+
+def test_quota_ignores_the_client_email_argument(tmp_path):
+    app, spool = make_app(tmp_path, max_client_bytes=3000)
+    client = app.test_client()
+
+    first = client.post('/upload?clientEmail=a@example.com', content_type='multipart/form-data',
+                        data={'document': (io.BytesIO(PDF), "letter.pdf")})
+    second = client.post('/upload?clientEmail=b@example.com', content_type='multipart/form-data',
+                         data={'document': (io.BytesIO(PDF), "letter.pdf")})
+
+    assert first.status_code == 200
+    assert second.status_code == 413
+    assert leftovers(spool) == []
+
+def post(app, data):
+    return app.test_client().post('/upload', content_type='multipart/form-data', data=data)
+
+@pytest.mark.parametrize("head, suffix", [
+    (b"%PDF-1.7", '.pdf'),
+    (b"\r\n" * 100 + b"%PDF-1.4", '.pdf'),
+    (b"\x89PNG\r\n\x1a\n", '.png'),
+    (b"\xff\xd8\xff\xe0", '.jpg'),
+    (b"II*\x00", '.tiff'),
+    (b"PK\x03\x04", None),
+    (b"<html>", None),
+])
+def test_sniffing(head, suffix):
+    assert sniff_type(head) == suffix
+
+def test_archives_only_where_allowed():
+    assert sniff_type(b"PK\x03\x04%PDF-1.4", archives=True) == '.zip'
+
+def test_oversized_upload_is_refused(tmp_path):
+    app, spool = make_app(tmp_path, max_request_bytes=1500)
+
+    response = post(app, {'document': (io.BytesIO(PDF), "letter.pdf")})
+
+    assert response.status_code == 413
+    assert leftovers(spool) == []
+
+def test_unsupported_type_is_refused(tmp_path):
+    app, spool = make_app(tmp_path)
+
+    response = post(app, {'document': (io.BytesIO(b"MZ" + b"0" * 2048), "letter.pdf")})
+
+    assert response.status_code == 415
+    assert leftovers(spool) == []
+
+def test_small_upload_is_named_for_its_real_type(tmp_path):
+    app, _ = make_app(tmp_path)
+
+    response = post(app, {'document': (io.BytesIO(b"\x89PNG\r\n\x1a\n tiny"), "scan.pdf")})
+
+    assert response.get_json()['path'].endswith("upload.png")
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return path
+
+def test_zip_members_go_through_the_same_checks(tmp_path):
+    spool = UploadSpool(tmp_path / "spool", max_request_bytes=2500)
+    archive = write_zip(tmp_path / "batch.zip", {
+        "letter.pdf": PDF,
+        "notes.txt": b"plain text " * 200,
+        "huge.pdf": PDF * 2,
+        "__MACOSX/._letter.pdf": b"resource fork",
+    })
+    (tmp_path / "out").mkdir()
+
+    results = dict(spool.extract(archive, tmp_path / "out", "client"))
+
+    assert results["letter.pdf"].read_bytes() == PDF
+    assert results["notes.txt"].status_code == 415
+    assert results["huge.pdf"].status_code == 413
+    assert "._letter.pdf" not in results
+    assert leftovers(spool) == []
+
+def test_zip_expanding_past_the_batch_cap_is_refused(tmp_path):
+    spool = UploadSpool(tmp_path / "spool", max_batch_bytes=5000)
+    archive = write_zip(tmp_path / "bomb.zip", {f"page{number}.pdf": PDF for number in range(4)})
+    (tmp_path / "out").mkdir()
+
+    with pytest.raises(UploadRejected) as rejected:
+        list(spool.extract(archive, tmp_path / "out", "client"))
+
+    assert rejected.value.status_code == 413
+
+def test_corrupt_zip_is_a_bad_request(tmp_path):
+    spool = UploadSpool(tmp_path / "spool")
+    archive = tmp_path / "broken.zip"
+    archive.write_bytes(b"PK\x03\x04 not really a zip")
+
+    with pytest.raises(UploadRejected) as rejected:
+        list(spool.extract(archive, tmp_path, "client"))
+
+    assert rejected.value.status_code == 400
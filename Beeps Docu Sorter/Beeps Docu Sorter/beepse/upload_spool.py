@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Upload Spool - streams API uploads to disk in chunks
+Enforces per-request and per-client size caps, detects the real file
+type from its magic bytes and hashes the content while bytes arrive, so
+oversized or unsupported uploads are rejected before they cost disk or CPU.
+Batch uploads may also be ZIP archives, unpacked through the same checks
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import defaultdict, deque
+from pathlib import Path, PurePosixPath
+from flask import Request, current_app
+from werkzeug.utils import secure_filename
+
+# Leading bytes of each format we can process, mapped to the suffix the
+# processor dispatches on
+MAGIC_TYPES = [
+    (b'%PDF-', '.pdf'),
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'II*\x00', '.tiff'),
+    (b'MM\x00*', '.tiff'),
+]
+
+# Accepted only by batch endpoints, which unpack them
+ARCHIVE_TYPES = [
+    (b'PK\x03\x04', '.zip'),
+]
+
+# PDF readers accept the %PDF- header anywhere in the first kilobyte
+SNIFF_BYTES = 1024
+
+CHUNK_SIZE = 64 * 1024
+
+class UploadRejected(Exception):
+    """An upload refused while streaming; status_code is the HTTP status"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+def sniff_type(head, archives=False):
+    """Suffix for the file type in the first bytes of an upload, or None"""
+    for magic, suffix in MAGIC_TYPES:
+        if head.startswith(magic):
+            return suffix
+    for magic, suffix in ARCHIVE_TYPES:
+        if head.startswith(magic):
+            # Checked before the PDF scan below: a ZIP of stored PDFs has
+            # %PDF- in its first kilobyte too
+            return suffix if archives else None
+    if b'%PDF-' in head[:SNIFF_BYTES]:
+        return '.pdf'
+    return None
+
+class ClientQuota:
+    """Bytes each client may upload within a sliding time window"""
+
+    def __init__(self, max_bytes, window=24 * 3600):
+        self.max_bytes = max_bytes
+        self.window = window
+        self._lock = threading.Lock()
+        self._usage = defaultdict(deque)
+        self._totals = defaultdict(int)
+
+    def _expire(self, client, now):
+        usage = self._usage[client]
+        while usage and now - usage[0][0] > self.window:
+            self._totals[client] -= usage.popleft()[1]
+
+    def remaining(self, client):
+        with self._lock:
+            self._expire(client, time.time())
+            return self.max_bytes - self._totals[client]
+
+    def check(self, client, size):
+        """Raise if another `size` bytes would take a client past the cap"""
+        if size > self.remaining(client):
+            raise UploadRejected(f"Upload quota of {self.max_bytes} bytes per client exceeded", 413)
+
+    def charge(self, client, size):
+        """Count a completed upload against a client"""
+        with self._lock:
+            self._usage[client].append((time.time(), size))
+            self._totals[client] += size
+
+class SpoolFile:
+    """Writable upload target: sniffs, caps and hashes bytes as they arrive
+
+    A strict spool file raises UploadRejected as soon as the type is
+    unsupported, aborting the request. A lenient one (batch uploads) drops
+    the rest of that part and raises from finish() instead, so the other
+    files in the batch still go through.
+    """
+
+    def __init__(self, spool, client, max_bytes, archives=False, strict=True, charge=True):
+        self.spool = spool
+        self.client = client
+        self.max_bytes = max_bytes
+        self.archives = archives
+        self.strict = strict
+        # Members unpacked from an archive were already charged as the archive
+        self.charge = charge
+        self.rejected = None
+        self.path = spool.incoming_dir / f"{uuid.uuid4().hex}.part"
+        self.file = None
+        self.head = b""
+        self.size = 0
+        self.suffix = None
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        if self.rejected:
+            return len(data)
+        if self.suffix is None:
+            # Hold back the first kilobyte until the type is known
+            self.head += data
+            if len(self.head) < SNIFF_BYTES:
+                return len(data)
+            if not self._start():
+                return len(data)
+            data, self.head = self.head, b""
+        self._append(data)
+        return len(data)
+
+    def _start(self):
+        """Sniff the buffered head; False if a lenient file was rejected"""
+        self.suffix = sniff_type(self.head, self.archives)
+        if self.suffix is None:
+            self.discard()
+            self.rejected = UploadRejected("Unsupported file type (expected PDF, JPEG, PNG or TIFF)", 415)
+            self.head = b""
+            if self.strict:
+                raise self.rejected
+            return False
+        self.file = open(self.path, 'wb')
+        return True
+
+    def _append(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise UploadRejected(f"Upload larger than {self.max_bytes} bytes", 413)
+        if self.charge:
+            try:
+                self.spool.quota.check(self.client, self.size)
+            except UploadRejected:
+                self.discard()
+                raise
+        self.digest.update(data)
+        self.file.write(data)
+
+    def finish(self):
+        """Flush a completed upload: returns (path, suffix, size, sha256)"""
+        if self.suffix is None and not self.rejected:
+            # Whole upload was smaller than the sniff window
+            self.strict = True
+            self._start()
+            data, self.head = self.head, b""
+            self._append(data)
+        if self.rejected:
+            raise self.rejected
+        self.file.close()
+        if self.charge:
+            self.spool.quota.charge(self.client, self.size)
+        return self.path, self.suffix, self.size, self.digest.hexdigest()
+
+    def discard(self):
+        """Drop a partial upload"""
+        if self.file is not None:
+            self.file.close()
+        if self.path.exists():
+            self.path.unlink()
+
+    # werkzeug rewinds the container and may read it back
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence) if self.file else 0
+
+    def read(self, size=-1):
+        return b""
+
+    def readline(self, size=-1):
+        return b""
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+class UploadSpool:
+    def __init__(self, spool_dir, max_request_bytes=50 * 1024 * 1024,
+                 max_client_bytes=500 * 1024 * 1024, client_window=24 * 3600,
+                 max_batch_bytes=500 * 1024 * 1024, batch_endpoints=()):
+        self.incoming_dir = Path(spool_dir) / "incoming"
+        self.incoming_dir.mkdir(parents=True, exist_ok=True)
+        # max_request_bytes caps one document; max_batch_bytes caps a whole
+        # batch request and everything unpacked from its archives
+        self.max_request_bytes = max_request_bytes
+        self.max_batch_bytes = max_batch_bytes
+        self.batch_endpoints = set(batch_endpoints)
+        self.quota = ClientQuota(max_client_bytes, client_window)
+
+    def open(self, client, batch=False):
+        if batch:
+            return SpoolFile(self, client, self.max_batch_bytes, archives=True, strict=False)
+        return SpoolFile(self, client, self.max_request_bytes)
+
+    def store(self, spool_file, dest_dir, filename):
+        """Move a finished upload into dest_dir, named with its real type:
+        returns (path, size, sha256)"""
+        path, suffix, size, sha256 = spool_file.finish()
+        stem = Path(filename).stem or "document"
+        dest = Path(dest_dir) / (stem + suffix)
+        number = 1
+        while dest.exists():
+            # Batches can carry several files with the same name
+            number += 1
+            dest = Path(dest_dir) / f"{stem}_{number}{suffix}"
+        os.replace(path, dest)
+        return dest, size, sha256
+
+    def extract(self, archive_path, dest_dir, client):
+        """Unpack a ZIP upload into dest_dir through the same type sniffing
+        and per-document cap: yields (name, path) per member, or
+        (name, UploadRejected) for a member that was refused"""
+        try:
+            archive = zipfile.ZipFile(archive_path)
+        except zipfile.BadZipFile as e:
+            raise UploadRejected(f"Corrupt ZIP archive: {e}", 400)
+
+        unpacked = 0
+        with archive:
+            for info in archive.infolist():
+                name = PurePosixPath(info.filename).name
+                if info.is_dir() or not name or name.startswith('.') or info.filename.startswith('__MACOSX/'):
+                    continue
+                # Guards against ZIP bombs: zipfile never reads past the
+                # declared size, so the declared sizes bound the work
+                unpacked += info.file_size
+                if unpacked > self.max_batch_bytes:
+                    raise UploadRejected(f"Archive expands past {self.max_batch_bytes} bytes", 413)
+
+                member = SpoolFile(self, client, self.max_request_bytes, charge=False)
+                try:
+                    with archive.open(info) as source:
+                        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                            member.write(chunk)
+                    dest, _, _ = self.store(member, dest_dir, secure_filename(name))
+                except UploadRejected as e:
+                    yield name, e
+                except (zipfile.BadZipFile, OSError) as e:
+                    member.discard()
+                    yield name, UploadRejected(f"Unreadable archive member: {e}", 400)
+                else:
+                    yield name, dest
+
+def client_key(request):
+    """Who an upload counts against: the remote address. Nothing the caller
+    sends (like clientEmail) is trusted, or a new value would buy a fresh quota"""
+    return request.remote_addr or "unknown"
+
+class SpoolingRequest(Request):
+    """Flask request whose multipart file parts stream into the upload spool
+
+    Parts the endpoint never stores (extra form fields, the rest of a
+    rejected batch) are discarded when the request is closed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._spooled = []
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # A stored part was already moved away, so this only drops leftovers
+            for spool_file in self._spooled:
+                spool_file.discard()
+            self._spooled = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = current_app.config.get('UPLOAD_SPOOL')
+        if spool is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        batch = self.endpoint in spool.batch_endpoints
+        limit = spool.max_batch_bytes if batch else spool.max_request_bytes
+        if total_content_length and total_content_length > limit:
+            raise UploadRejected(f"Upload larger than {limit} bytes", 413)
+        client = client_key(self)
+        if spool.quota.remaining(client) < max(total_content_length or 0, 1):
+            raise UploadRejected("Upload quota per client exceeded", 413)
+        spool_file = spool.open(client, batch)
+        self._spooled.append(spool_file)
+        return spool_file
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Folder Watcher - keeps processing the uploads directory as files arrive
+Uses inotify on Linux and falls back to polling elsewhere; the processing
+journal remembers what has already been handled
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from journal import ProcessingJournal
+
+# inotify event bits (see <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+EVENT_HEADER = struct.Struct('iIII')
+
+class Inotify:
+    """Minimal ctypes wrapper reporting files closed after writing or
+    renamed into one directory"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"inotify_add_watch failed for {directory}")
+
+    def read(self, timeout):
+        """Names of files that finished arriving, or None if events were lost"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class FolderWatcher:
+    def __init__(self, processor, journal=None, poll_interval=2.0, settle_time=2.0,
+                 use_inotify=None):
+        self.processor = processor
+        self.input_dir = processor.input_dir
+        # Checkpoint of handled files (the same journal --resume uses)
+        self.journal = journal or ProcessingJournal(processor.output_dir / "processing_journal.jsonl")
+        self.poll_interval = poll_interval
+        # Polling: a file is complete once its size and mtime hold this long
+        self.settle_time = settle_time
+        self.use_inotify = sys.platform.startswith('linux') if use_inotify is None else use_inotify
+        self.running = False
+
+    def is_new(self, path):
+        if path.name.startswith('.') or not path.is_file():
+            return False
+        return not self.journal.is_done(path)
+
+    def process(self, paths):
+        """Process newly arrived files, journalling each result as it lands"""
+        paths = sorted((path for path in paths if self.is_new(path)), key=lambda path: path.name)
+        return {record['file']: record['status']
+                for record in self.processor.iter_process(paths, journal=self.journal)}
+
+    def run(self):
+        """Handle the existing backlog, then keep processing new arrivals"""
+        self.running = True
+        print(f"👀 Watching {self.input_dir} ({len(self.journal.entries)} files in the journal)")
+        self.process(self.processor.list_input_files())
+
+        inotify = None
+        if self.use_inotify:
+            try:
+                inotify = Inotify(self.input_dir)
+            except (OSError, AttributeError) as e:
+                print(f"⚠️ inotify unavailable ({e}), polling every {self.poll_interval}s")
+        try:
+            if inotify:
+                self._watch_inotify(inotify)
+            else:
+                self._watch_polling()
+        finally:
+            if inotify:
+                inotify.close()
+
+    def stop(self):
+        self.running = False
+
+    def _watch_inotify(self, inotify):
+        while self.running:
+            names = inotify.read(self.poll_interval)
+            if names is None:
+                # The kernel queue overflowed; rescan to catch what was missed
+                self.process(self.processor.list_input_files())
+            elif names:
+                self.process(self.input_dir / name for name in names)
+
+    def _watch_polling(self):
+        pending = {}
+        while self.running:
+            now = time.monotonic()
+            with os.scandir(self.input_dir) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    signature = (stat.st_size, stat.st_mtime_ns)
+                    if self.journal.is_done(entry.path, signature):
+                        continue
+                    previous = pending.get(entry.name)
+                    if previous is None or previous[0] != signature:
+                        pending[entry.name] = (signature, now)
+
+            settled = [name for name, (_, seen) in pending.items() if now - seen >= self.settle_time]
+            for name in settled:
+                del pending[name]
+            if settled:
+                self.process(self.input_dir / name for name in settled)
+            time.sleep(self.poll_interval)